@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Dict, List, Optional
+
+from .command import Command, CommandResult
+
+
+# the drivers are not safe to call from several threads at once (except NewportESP301, which
+# locks its port), so once a receiver has a queue every command for it should go through it
+class CommandQueue:
+    """Worker thread that runs the commands of one receiver in submission order."""
+
+    def __init__(self, receiver: object, name: Optional[str] = None):
+        self._receiver = receiver
+        if name is None:
+            name = type(receiver).__name__
+        self._name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name + " queue")
+        self._futures: List[Future] = []
+
+    @property
+    def receiver(self) -> object:
+        return self._receiver
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def submit(self, command: Command) -> Future:
+        # the future resolves to the command's CommandResult, an exception inside execute
+        # becomes a failed result instead of being raised from result()
+        receiver = getattr(command, '_receiver', None)
+        if receiver is not None and receiver is not self._receiver:
+            raise ValueError(type(command).__name__ + " does not belong to the " + self._name + " queue.")
+        future = self._executor.submit(self._run, command)
+        self._futures = [pending for pending in self._futures if not pending.done()]
+        self._futures.append(future)
+        return future
+
+    def _run(self, command: Command) -> CommandResult:
+        try:
+            command.execute()
+        except Exception as e:
+            return CommandResult(False, repr(e))
+        return command.result
+
+    @property
+    def pending_count(self) -> int:
+        return len([future for future in self._futures if not future.done()])
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        # waits for everything submitted so far, False if the timeout ran out first
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for future in list(self._futures):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                future.result(remaining)
+            except TimeoutError:
+                return False
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+# one queue per receiver, created on first use
+_queues: Dict[int, CommandQueue] = {}
+_queues_lock = threading.Lock()
+
+def command_queue(receiver: object) -> CommandQueue:
+    with _queues_lock:
+        queue = _queues.get(id(receiver))
+        if queue is None:
+            queue = CommandQueue(receiver)
+            _queues[id(receiver)] = queue
+        return queue
+
+def submit(command: Command) -> Future:
+    # queues the command on its receiver's worker, e.g.
+    #   lamp_result = submit(ScitechLampTurnOn(lamp))
+    #   stage_result = submit(NewportESP301HomeAll(esp))
+    #   lamp_result.result(), stage_result.result()
+    receiver = getattr(command, '_receiver', None)
+    if receiver is None:
+        raise ValueError(type(command).__name__ + " has no receiver to queue it on.")
+    return command_queue(receiver).submit(command)
+
+def shutdown_queues(wait: bool = True) -> None:
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for queue in queues:
+        queue.shutdown(wait)
@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence
+
+from .command import Command, CommandResult, CompositeCommand
+
+
+# each child runs after the children it depends on and after the previous child added for
+# any of its devices, so a device still sees its commands one at a time in the order they
+# were added while children on different devices overlap
+class ParallelCompositeCommand(CompositeCommand):
+    """Composite command that runs children on different devices in parallel."""
+
+    def __init__(self, max_workers: Optional[int] = None, stop_on_failure: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self._max_workers = max_workers
+        # after a failure nothing new is started, otherwise only the failed child's dependents are skipped
+        self._stop_on_failure = stop_on_failure
+        self._children: List[Command] = []
+        self._dependencies: Dict[int, List[int]] = {}
+        self._last_on_device: Dict[int, int] = {}
+        self._child_results: Dict[int, CommandResult] = {}
+        self._durations: Dict[int, float] = {}
+
+    def add_command(self, command: Command, depends_on: Optional[Sequence[Command]] = None, devices: Optional[Sequence[object]] = None) -> Command:
+        # devices defaults to the command's receiver, composites without one need them passed in
+        if devices is None:
+            receiver = getattr(command, '_receiver', None)
+            devices = [receiver] if receiver is not None else []
+        if depends_on is None:
+            depends_on = []
+
+        ndx = len(self._children)
+        dependencies = []
+        for dependency in depends_on:
+            dependency_ndx = self._index(dependency)
+            if dependency_ndx is None:
+                raise ValueError(type(dependency).__name__ + " must be added before the commands that depend on it.")
+            dependencies.append(dependency_ndx)
+        for device in devices:
+            previous = self._last_on_device.get(id(device))
+            if previous is not None and previous not in dependencies:
+                dependencies.append(previous)
+            self._last_on_device[id(device)] = ndx
+
+        super().add_command(command)
+        self._children.append(command)
+        self._dependencies[ndx] = dependencies
+        return command
+
+    def _index(self, command: Command) -> Optional[int]:
+        for ndx, child in enumerate(self._children):
+            if child is command:
+                return ndx
+        return None
+
+    @property
+    def durations(self) -> Dict[Command, float]:
+        # wall time of every child that ran during the last execute
+        return {self._children[ndx]: duration for ndx, duration in self._durations.items()}
+
+    def execute(self) -> None:
+        self._child_results = {}
+        self._durations = {}
+        start_time = time.monotonic()
+        pending = set(range(len(self._children)))
+        running: Dict[Future, int] = {}
+        failures = []
+        skipped = []
+
+        max_workers = self._max_workers or max(1, len(self._children))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ParallelCompositeCommand") as executor:
+            while pending or running:
+                if not (failures and self._stop_on_failure):
+                    for ndx in sorted(pending):
+                        dependencies = self._dependencies[ndx]
+                        if any([dependency in pending or dependency in running.values() for dependency in dependencies]):
+                            continue
+                        pending.discard(ndx)
+                        if any([not self._child_results[dependency].was_successful for dependency in dependencies]):
+                            # a skipped child counts as failed for its own dependents
+                            self._child_results[ndx] = CommandResult(False, "Skipped because a dependency failed.")
+                            skipped.append(ndx)
+                            continue
+                        running[executor.submit(self._run_child, ndx)] = ndx
+                elif not running:
+                    skipped.extend(sorted(pending))
+                    pending.clear()
+                    break
+
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    ndx = running.pop(future)
+                    result = self._child_results[ndx]
+                    if not result.was_successful:
+                        failures.append(type(self._children[ndx]).__name__ + ": " + str(result.message))
+
+        elapsed_time = time.monotonic() - start_time
+        if failures:
+            message = "; ".join(failures)
+            if skipped:
+                message += " (" + str(len(skipped)) + " commands skipped)"
+            self._result = CommandResult(False, message)
+        else:
+            self._result = CommandResult(True, "Successfully executed " + str(len(self._children)) + " commands in " + str(round(elapsed_time, 3)) + " s.")
+
+    def _run_child(self, ndx: int) -> None:
+        command = self._children[ndx]
+        start_time = time.monotonic()
+        try:
+            command.execute()
+            result = command.result
+        except Exception as e:
+            result = CommandResult(False, repr(e))
+        self._durations[ndx] = time.monotonic() - start_time
+        self._child_results[ndx] = result
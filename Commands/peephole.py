@@ -0,0 +1,184 @@
+import copy
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from .command import Command, CommandResult, CompositeCommand
+
+
+# what a command does to its receiver:
+#   'overwrite'  sets a slot, only the last of two back-to-back writes to a slot matters
+#   'additive'   adds value_param to a slot, e.g. a relative move
+#   'idempotent' running it twice in a row does nothing more, key None means the whole receiver
+class PeepholeRule(NamedTuple):
+    kind: str
+    key: Callable[[Dict[str, Any]], Optional[Hashable]]
+    value_param: Optional[str] = None
+
+def _slot(name: str) -> Callable[[Dict[str, Any]], Hashable]:
+    return lambda params: name
+
+def _axis_slot(name: str) -> Callable[[Dict[str, Any]], Hashable]:
+    return lambda params: (name, params.get('axis_number'))
+
+def _whole_receiver(params: Dict[str, Any]) -> None:
+    return None
+
+# keyed by class name so this module does not need every device package installed,
+# commands without a rule are never touched and nothing is moved across them. on/off pairs
+# (shutter, arc lamp, cooling) are left out, opening and closing the shutter is an exposure
+peephole_rules: Dict[str, PeepholeRule] = {
+    'ScitechLampSetAttenuator': PeepholeRule('overwrite', _slot('attenuator'), 'percent'),
+    'ScitechLampOpenAttenuator': PeepholeRule('overwrite', _slot('attenuator')),
+    'ScitechLampSetCurrent': PeepholeRule('overwrite', _slot('current'), 'percent'),
+    'IkaStirrerChangeTemperature': PeepholeRule('overwrite', _slot('temperature'), 'temp'),
+    'IkaStirrerStopHeating': PeepholeRule('overwrite', _slot('temperature')),
+    'IkaStirrerChangeStirRate': PeepholeRule('overwrite', _slot('stir_rate'), 'rate'),
+    'IkaStirrerStopStirring': PeepholeRule('overwrite', _slot('stir_rate')),
+    'NewportESP301MoveSpeedAbsolute': PeepholeRule('overwrite', _axis_slot('position'), 'position'),
+    'NewportESP301HorzMoveSpeedAbsolute': PeepholeRule('overwrite', _axis_slot('position'), 'position'),
+    'NewportESP301MoveSpeedRelative': PeepholeRule('additive', _axis_slot('position'), 'distance'),
+    'ArcLampPowerSupplyTurnOn': PeepholeRule('idempotent', _whole_receiver),
+    'ScitechLampConnect': PeepholeRule('idempotent', _whole_receiver),
+    'ScitechLampInitialize': PeepholeRule('idempotent', _whole_receiver),
+    'ArcLampPowerSupplyConnect': PeepholeRule('idempotent', _whole_receiver),
+    'ArcLampPowerSupplyInitialize': PeepholeRule('idempotent', _whole_receiver),
+    'IkaStirrerConnect': PeepholeRule('idempotent', _whole_receiver),
+    'IkaStirrerInitialize': PeepholeRule('idempotent', _whole_receiver),
+    'NewportESP301Connect': PeepholeRule('idempotent', _whole_receiver),
+    'NewportESP301Initialize': PeepholeRule('idempotent', _whole_receiver),
+}
+
+# commands on another receiver that a rule may look past, they only read so running them
+# before or after a pair on a different device makes no difference
+commuting_commands = {
+    'ScitechLampGetStatus',
+    'ScitechLampGetFeedback',
+    'NewportESP301GetAxisUnit',
+    'NewportESP301GetPositions',
+    'NewportESP301GetMotionDone',
+}
+
+def _rule(command: Command) -> Optional[PeepholeRule]:
+    return peephole_rules.get(type(command).__name__)
+
+def _params(command: Command) -> Dict[str, Any]:
+    return getattr(command, '_params', {})
+
+def _describe(command: Command) -> str:
+    return type(command).__name__ + str(_params(command))
+
+def _next_on_receiver(commands: List[Command], ndx: int) -> Optional[int]:
+    # the next command on the same receiver, as long as everything in between runs on other
+    # receivers and is declared commuting, anything else stops the search
+    receiver = getattr(commands[ndx], '_receiver', None)
+    for next_ndx in range(ndx + 1, len(commands)):
+        next_command = commands[next_ndx]
+        if getattr(next_command, '_receiver', None) is receiver:
+            if _rule(next_command) is None:
+                return None
+            return next_ndx
+        if type(next_command).__name__ not in commuting_commands:
+            return None
+    return None
+
+def _with_param(command: Command, name: str, value: Any) -> Command:
+    rewritten = copy.copy(command)
+    rewritten._params = dict(_params(command))
+    rewritten._params[name] = value
+    return rewritten
+
+def _combine(first: Command, second: Command) -> Optional[Tuple[Optional[Command], Optional[Command], str]]:
+    # replacements for the two commands (None drops one) and what was done, None if they do not combine
+    first_rule = _rule(first)
+    second_rule = _rule(second)
+    first_params = _params(first)
+    second_params = _params(second)
+
+    if first_rule.kind == 'idempotent' or second_rule.kind == 'idempotent':
+        if type(first) is type(second) and first_params == second_params:
+            return (first, None, "Dropped repeated " + _describe(second) + ".")
+        return None
+    first_key = first_rule.key(first_params)
+    if first_key is None or first_key != second_rule.key(second_params):
+        return None
+    # a missing value makes the driver fail the command, which must still happen
+    for rule, params in ((first_rule, first_params), (second_rule, second_params)):
+        if rule.value_param is not None and params.get(rule.value_param) is None:
+            return None
+
+    if second_rule.kind == 'overwrite':
+        return (None, second, "Dropped " + _describe(first) + ", overwritten by " + _describe(second) + ".")
+    if first_params.get('speed') != second_params.get('speed'):
+        return None
+
+    distance = second_params[second_rule.value_param]
+    if first_rule.kind == 'overwrite' and first_rule.value_param is not None:
+        target = first_params[first_rule.value_param] + distance
+        return (_with_param(first, first_rule.value_param, target), None, "Merged " + _describe(first) + " and " + _describe(second) + " into one move to " + str(target) + ".")
+    if first_rule.kind == 'additive':
+        total = first_params[first_rule.value_param] + distance
+        if abs(total) < 1e-12:
+            return (None, None, "Dropped " + _describe(first) + " and " + _describe(second) + ", they cancel out.")
+        return (_with_param(first, first_rule.value_param, total), None, "Merged " + _describe(first) + " and " + _describe(second) + " into one move by " + str(total) + ".")
+    return None
+
+def optimize_commands(commands: List[Command]) -> Tuple[List[Command], List[str]]:
+    # rewrites until no rule applies, returns the new sequence and one line per change
+    commands = list(commands)
+    report = []
+    is_changed = True
+    while is_changed:
+        is_changed = False
+        for ndx, command in enumerate(commands):
+            rule = _rule(command)
+            if rule is None:
+                continue
+            if rule.kind == 'additive' and rule.value_param is not None and _params(command).get(rule.value_param) == 0.0:
+                commands.pop(ndx)
+                report.append("Dropped " + _describe(command) + ", it does not move.")
+                is_changed = True
+                break
+            next_ndx = _next_on_receiver(commands, ndx)
+            if next_ndx is None:
+                continue
+            rewrite = _combine(command, commands[next_ndx])
+            if rewrite is None:
+                continue
+            first, second, note = rewrite
+            commands = commands[:ndx] + ([first] if first is not None else []) + commands[ndx+1:next_ndx] + ([second] if second is not None else []) + commands[next_ndx+1:]
+            report.append(note)
+            is_changed = True
+            break
+    return (commands, report)
+
+# CompositeCommand that runs the optimized sequence, stopping at the first failure
+class OptimizingCompositeCommand(CompositeCommand):
+    """Composite command that drops and merges redundant children before running them."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._children: List[Command] = []
+        self._report: List[str] = []
+
+    def add_command(self, command: Command) -> Command:
+        super().add_command(command)
+        self._children.append(command)
+        return command
+
+    @property
+    def report(self) -> List[str]:
+        # changes made by the last optimize or execute
+        return self._report
+
+    def optimize(self) -> List[Command]:
+        commands, self._report = optimize_commands(self._children)
+        return commands
+
+    def execute(self) -> None:
+        commands = self.optimize()
+        for command in commands:
+            command.execute()
+            result = command.result
+            if not result.was_successful:
+                self._result = CommandResult(False, type(command).__name__ + ": " + str(result.message))
+                return
+        self._result = CommandResult(True, "Successfully executed " + str(len(commands)) + " of " + str(len(self._children)) + " commands after optimizing.")
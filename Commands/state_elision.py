@@ -0,0 +1,149 @@
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from .command import Command, CommandResult, CompositeCommand
+
+
+class ElidedCommandResult(CommandResult):
+    """Result of a command that was skipped because its effect was already in place."""
+    elided = True
+
+def is_elided(result: CommandResult) -> bool:
+    return getattr(result, 'elided', False)
+
+# what a successful command leaves behind: the state key and the value it sets, worked out
+# from the command's params and its receiver
+class ElisionRule(NamedTuple):
+    key: str
+    value: Callable[[Dict[str, Any], Any], Any]
+
+def _constant(value: Any) -> Callable[[Dict[str, Any], Any], Any]:
+    return lambda params, receiver: value
+
+def _param(name: str, default_attribute: Optional[str] = None) -> Callable[[Dict[str, Any], Any], Any]:
+    # None params fall back to the receiver's default, like the driver does
+    def value(params: Dict[str, Any], receiver: Any) -> Any:
+        if params.get(name) is None and default_attribute is not None:
+            return getattr(receiver, default_attribute)
+        return params.get(name)
+    return value
+
+# keyed by class name so this module does not need every device package installed
+elision_rules: Dict[str, ElisionRule] = {
+    'ScitechLampEnableCooling': ElisionRule('cooling', _constant(True)),
+    'ScitechLampDisableCooling': ElisionRule('cooling', _constant(False)),
+    'ScitechLampOpenShutter': ElisionRule('shutter_open', _constant(True)),
+    'ScitechLampCloseShutter': ElisionRule('shutter_open', _constant(False)),
+    'ScitechLampEnableArcLamp': ElisionRule('arc_lamp', _constant(True)),
+    'ScitechLampDisableArcLamp': ElisionRule('arc_lamp', _constant(False)),
+    'ScitechLampOpenAttenuator': ElisionRule('attenuator', _constant(100)),
+    'ScitechLampSetAttenuator': ElisionRule('attenuator', _param('percent')),
+    'ScitechLampSetCurrent': ElisionRule('current', _param('percent')),
+    # ArcLampPowerSupplyTurnOff is left out, it currently calls turn_on
+    'ArcLampPowerSupplyTurnOn': ElisionRule('lamp_on', _constant(True)),
+    'IkaStirrerChangeTemperature': ElisionRule('temperature', _param('temp', 'default_temp_')),
+    'IkaStirrerStopHeating': ElisionRule('temperature', _constant(None)),
+    'IkaStirrerChangeStirRate': ElisionRule('stir_rate', _param('rate', 'default_stir_rate_')),
+    'IkaStirrerStopStirring': ElisionRule('stir_rate', _constant(None)),
+}
+
+# commands that only read, everything else without a rule may change anything on its receiver
+read_only_commands = {
+    'ScitechLampGetStatus',
+    'ScitechLampGetFeedback',
+    'NewportESP301GetAxisUnit',
+    'NewportESP301GetPositions',
+    'NewportESP301GetMotionDone',
+}
+
+class DeviceStateModel:
+    """Last known state of each receiver, as left by the commands that ran on it."""
+
+    def __init__(self, max_age: float = 60.0):
+        # state older than max_age seconds is not trusted, e.g. the lamp may have tripped since
+        self._max_age = max_age
+        self._states: Dict[int, Dict[str, Tuple[Any, float]]] = {}
+        self._lock = threading.Lock()
+        self.elided_count = 0
+
+    def get(self, receiver: Any, key: str) -> Tuple[bool, Any]:
+        # (is_known, value), unknown when never recorded or older than max_age
+        with self._lock:
+            entry = self._states.get(id(receiver), {}).get(key)
+        if entry is None or time.monotonic() - entry[1] > self._max_age:
+            return (False, None)
+        return (True, entry[0])
+
+    def record(self, receiver: Any, key: str, value: Any) -> None:
+        with self._lock:
+            self._states.setdefault(id(receiver), {})[key] = (value, time.monotonic())
+
+    def invalidate(self, receiver: Optional[Any] = None, key: Optional[str] = None) -> None:
+        # no receiver forgets everything, e.g. after a manual change on the bench
+        with self._lock:
+            if receiver is None:
+                self._states = {}
+            elif key is None:
+                self._states.pop(id(receiver), None)
+            else:
+                self._states.get(id(receiver), {}).pop(key, None)
+
+    def execute(self, command: Command) -> CommandResult:
+        # runs the command unless its rule says the receiver is already in the target state
+        receiver = getattr(command, '_receiver', None)
+        rule = elision_rules.get(type(command).__name__)
+        if rule is not None and receiver is not None:
+            target = rule.value(getattr(command, '_params', {}), receiver)
+            is_known, value = self.get(receiver, rule.key)
+            if is_known and value == target:
+                command._result = ElidedCommandResult(True, "Skipped " + type(command).__name__ + ", " + rule.key + " was already " + str(target) + ".")
+                self.elided_count += 1
+                return command.result
+
+        command.execute()
+        result = command.result
+
+        if type(command).__name__ in read_only_commands:
+            return result
+        if receiver is None:
+            # a composite or other receiverless command may have touched any device
+            self.invalidate()
+        elif rule is None:
+            self.invalidate(receiver)
+        elif result.was_successful:
+            self.record(receiver, rule.key, target)
+        else:
+            self.invalidate(receiver, rule.key)
+        return result
+
+# CompositeCommand that runs its children through a DeviceStateModel, stopping at the first failure
+class ElidingCompositeCommand(CompositeCommand):
+    """Composite command that skips children whose effect is already in place."""
+
+    def __init__(self, state: Optional[DeviceStateModel] = None, **kwargs):
+        super().__init__(**kwargs)
+        if state is None:
+            state = DeviceStateModel()
+        self._state = state
+        self._children = []
+
+    @property
+    def state(self) -> DeviceStateModel:
+        return self._state
+
+    def add_command(self, command: Command) -> Command:
+        super().add_command(command)
+        self._children.append(command)
+        return command
+
+    def execute(self) -> None:
+        elided_count = 0
+        for command in self._children:
+            result = self._state.execute(command)
+            if not result.was_successful:
+                self._result = CommandResult(False, type(command).__name__ + ": " + str(result.message))
+                return
+            if is_elided(result):
+                elided_count += 1
+        self._result = CommandResult(True, "Successfully executed " + str(len(self._children) - elided_count) + " commands, skipped " + str(elided_count) + " already in place.")
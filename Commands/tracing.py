@@ -0,0 +1,249 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .command import Command
+
+
+# spans are kept as Chrome trace "complete" events (ph X) with microsecond timestamps, nesting
+# comes from the spans of one thread containing each other, which is how Perfetto draws them
+#
+#   enable_tracing()
+#   trace_commands()
+#   trace_device(esp)
+#   ... run the recipe ...
+#   export_chrome_trace("run.json")  # open in chrome://tracing or ui.perfetto.dev
+#
+# with tracing off every instrumented call costs one flag check
+
+_enabled = False
+_events: List[Dict[str, Any]] = []
+_thread_names: Dict[int, str] = {}
+_origin = time.perf_counter()
+
+def enable_tracing() -> None:
+    global _enabled
+    _enabled = True
+
+def disable_tracing() -> None:
+    global _enabled
+    _enabled = False
+
+def is_tracing() -> bool:
+    return _enabled
+
+def clear_trace() -> None:
+    _events.clear()
+    _thread_names.clear()
+
+class _Span:
+    __slots__ = ('_name', '_category', '_args', '_start')
+
+    def __init__(self, name: str, category: str, args: Dict[str, Any]):
+        self._name = name
+        self._category = category
+        self._args = args
+
+    @property
+    def args(self) -> Dict[str, Any]:
+        # can be filled in while the span is open, e.g. with a result
+        return self._args
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        end = time.perf_counter()
+        thread = threading.current_thread()
+        if thread.ident not in _thread_names:
+            _thread_names[thread.ident] = thread.name
+        if exc_type is not None:
+            self._args['exception'] = repr(exc_value)
+        _events.append({
+            'name': self._name,
+            'cat': self._category,
+            'ph': 'X',
+            'ts': (self._start - _origin) * 1e6,
+            'dur': (end - self._start) * 1e6,
+            'pid': os.getpid(),
+            'tid': thread.ident,
+            'args': self._args,
+        })
+
+class _NullSpan:
+    __slots__ = ()
+
+    @property
+    def args(self) -> Dict[str, Any]:
+        return {}
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+_null_span = _NullSpan()
+
+def span(name: str, category: str = "", **args):
+    if not _enabled:
+        return _null_span
+    return _Span(name, category, args)
+
+def device_name(device: object) -> str:
+    name = getattr(device, 'name', None) or getattr(device, '_name', None)
+    if name is None:
+        return type(device).__name__
+    return str(name)
+
+def _record_result(trace_span, result: Any) -> None:
+    # device methods return (was_successful, message), commands leave a CommandResult
+    if isinstance(result, (tuple, list)) and len(result) == 2 and isinstance(result[0], bool):
+        trace_span.args['was_successful'] = result[0]
+        if not result[0]:
+            trace_span.args['message'] = str(result[1])
+
+def _traced_execute(execute: Callable[[Command], None]) -> Callable[[Command], None]:
+    @functools.wraps(execute)
+    def wrapper(self):
+        if not _enabled:
+            return execute(self)
+        receiver = getattr(self, '_receiver', None)
+        args = {'params': repr(getattr(self, '_params', {}))}
+        if receiver is not None:
+            args['device'] = device_name(receiver)
+        with span(type(self).__name__, "command", **args) as trace_span:
+            execute(self)
+            result = getattr(self, 'result', None)
+            if result is not None:
+                trace_span.args['was_successful'] = getattr(result, 'was_successful', None)
+    wrapper._is_traced = True
+    return wrapper
+
+def trace_commands(base: type = Command) -> None:
+    # wraps execute on every command class imported so far, call again after importing more
+    classes = [base]
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        execute = cls.__dict__.get('execute')
+        if execute is not None and not getattr(execute, '_is_traced', False):
+            cls.execute = _traced_execute(execute)
+
+class _TracedSerial:
+    """pyserial port whose reads and writes are recorded as spans."""
+
+    def __init__(self, ser: Any, name: str):
+        self._ser = ser
+        self._name = name
+
+    def write(self, data: bytes) -> int:
+        if not _enabled:
+            return self._ser.write(data)
+        with span("ser.write", "serial", device=self._name, data=repr(data)):
+            return self._ser.write(data)
+
+    def readline(self, *args, **kwargs) -> bytes:
+        if not _enabled:
+            return self._ser.readline(*args, **kwargs)
+        with span("ser.readline", "serial", device=self._name) as trace_span:
+            response = self._ser.readline(*args, **kwargs)
+            trace_span.args['response'] = repr(response)
+            return response
+
+    def read(self, *args, **kwargs) -> bytes:
+        if not _enabled:
+            return self._ser.read(*args, **kwargs)
+        with span("ser.read", "serial", device=self._name) as trace_span:
+            response = self._ser.read(*args, **kwargs)
+            trace_span.args['response'] = repr(response)
+            return response
+
+    # everything else (is_open, timeout, reset_input_buffer, ...) is the real port's
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._ser, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in ('_ser', '_name'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._ser, name, value)
+
+def _traced_method(method: Callable[..., Any], name: str, device: str) -> Callable[..., Any]:
+    if inspect.iscoroutinefunction(method):
+        # the span has to stay open until the awaited call is done, not just until the coroutine is created
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            if not _enabled:
+                return await method(*args, **kwargs)
+            with span(name, "device", device=device) as trace_span:
+                result = await method(*args, **kwargs)
+                _record_result(trace_span, result)
+                return result
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return method(*args, **kwargs)
+        with span(name, "device", device=device) as trace_span:
+            result = method(*args, **kwargs)
+            _record_result(trace_span, result)
+            return result
+    return wrapper
+
+# private methods that talk to the port, traced by default next to the public methods
+traced_private_methods = ['_write', '_query', '_query_batch']
+
+def trace_device(device: object, methods: Optional[List[str]] = None) -> None:
+    # wraps the device's public methods and its port exchanges on the instance, which puts the
+    # check_serial and check_initialized checks and the method body in one span, and wraps its
+    # serial port. coroutine methods (NewportESP301Async) get spans that cover the awaited call.
+    # decorators that want a span of their own, like check_axis_num, open it through the
+    # device's _trace_span, which drivers look up with getattr so they need not import this module
+    name = device_name(device)
+    if methods is None:
+        methods = [attribute for attribute in dir(type(device))
+                   if (not attribute.startswith('_') or attribute in traced_private_methods)
+                   and attribute != 'is_axis_num_valid'
+                   and callable(getattr(type(device), attribute, None))]
+    for method_name in methods:
+        if method_name in vars(device):
+            # already traced
+            continue
+        method = getattr(device, method_name)
+        setattr(device, method_name, _traced_method(method, type(device).__name__ + "." + method_name, name))
+
+    device._trace_span = lambda span_name, category, **args: span(span_name, category, device=name, **args)
+
+    _trace_serial(device, name)
+    start_serial = vars(device).get('start_serial')
+    # an asyncio driver has no pyserial port to wrap
+    if start_serial is not None and not getattr(start_serial, '_is_traced', False) and not inspect.iscoroutinefunction(start_serial):
+        # the port may be replaced when it is opened
+        @functools.wraps(start_serial)
+        def traced_start_serial(*args, **kwargs):
+            result = start_serial(*args, **kwargs)
+            _trace_serial(device, name)
+            return result
+        traced_start_serial._is_traced = True
+        device.start_serial = traced_start_serial
+
+def _trace_serial(device: object, name: str) -> None:
+    ser = getattr(device, 'ser', None)
+    if ser is not None and not isinstance(ser, _TracedSerial):
+        device.ser = _TracedSerial(ser, name)
+
+def export_chrome_trace(path: str) -> int:
+    # returns the number of spans written
+    events = list(_events)
+    metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                for tid, name in list(_thread_names.items())]
+    with open(path, 'w') as trace_file:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, trace_file)
+    return len(events)
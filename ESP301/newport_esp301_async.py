@@ -0,0 +1,476 @@
+import asyncio
+import functools
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from .newport_esp301 import ESP301Core, ESP301Error, unit_mappings
+
+
+# coroutine versions of check_serial, check_initialized and check_axis_num with the same messages
+def check_serial(func):
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        if not self.is_open:
+            return (False, "Serial port " + self.port + " is not open. ")
+        return await func(self, *args, **kwargs)
+    return wrapper
+
+def check_initialized(func):
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        if not self._is_initialized:
+            return (False, "ESP301 axes are not initialized.")
+        return await func(self, *args, **kwargs)
+    return wrapper
+
+def check_axis_num(func):
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        # could be a kwarg or arg
+        if 'axis_number' in kwargs:
+            axis_number = kwargs['axis_number']
+        else:
+            axis_number = args[0]
+
+        trace_span = getattr(self, '_trace_span', None)
+        if trace_span is None:
+            is_valid = self.is_axis_num_valid(axis_number)
+        else:
+            # set by tracing.trace_device
+            with trace_span("check_axis_num", "check") as check_span:
+                is_valid = self.is_axis_num_valid(axis_number)
+                check_span.args['is_valid'] = is_valid
+        if not is_valid:
+            return (False, "Axis number is not valid or not part of passed tuple during construction.")
+        return await func(self, *args, **kwargs)
+    return wrapper
+
+# same command set and results as NewportESP301, but every exchange is awaited on an
+# asyncio stream so one event loop can drive many controllers without a thread each. argument
+# checks, caches and reply formats come from ESP301Core, only the I/O lives here
+class NewportESP301Async(ESP301Core):
+    """asyncio driver for the Newport ESP301 motion controller."""
+
+    def __init__(
+            self,
+            name: str,
+            port: str,
+            baudrate: int = 921600,
+            timeout: Optional[float] = 1.0,
+            axis_list: Tuple[int, ...] = (1,),
+            default_speed_list: List[float] = [10.0, 10.0, 10.0],
+            max_speed_list: List[float] = [100.0, 40.0, 20.0],
+            units_list: List[str] = ['millimeter', 'millimeter', 'degree'],
+            poll_interval: float = 0.1,
+            predictive_wait: bool = True,
+            wake_margin: float = 0.02,
+            fine_poll_interval: float = 0.005):
+
+        self._name = name
+        self.port = port
+        self._baudrate = baudrate
+        self._timeout = timeout
+        self._axis_list = axis_list
+        self._default_speed_list = default_speed_list
+        self._max_speed_list = max_speed_list
+        self._units_list = units_list
+        self._poll_interval = poll_interval
+        self._predictive_wait = predictive_wait
+        self._wake_margin = wake_margin
+        self._fine_poll_interval = fine_poll_interval
+        self._is_initialized = False
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # one request/reply exchange on the port at a time
+        self._io_lock: Optional[asyncio.Lock] = None
+        self._init_caches()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    # opens the port with pyserial-asyncio unless another stream pair is passed in,
+    # e.g. a TCP serial bridge from asyncio.open_connection
+    async def start_serial(self, reader: Optional[asyncio.StreamReader] = None, writer: Optional[asyncio.StreamWriter] = None) -> Tuple[bool, str]:
+        if reader is None or writer is None:
+            try:
+                import serial_asyncio
+            except ImportError:
+                return (False, "pyserial-asyncio is required to open " + self.port + ".")
+            try:
+                reader, writer = await serial_asyncio.open_serial_connection(url=self.port, baudrate=self._baudrate)
+            except Exception as e:
+                return (False, "Could not open serial port " + self.port + ": " + str(e))
+        self._reader = reader
+        self._writer = writer
+        self._io_lock = asyncio.Lock()
+        # the controller may have been power cycled while the port was closed
+        self._parameter_cache = {}
+        self.invalidate_positions()
+        return (True, "Serial port " + self.port + " opened.")
+
+    async def stop_serial(self) -> Tuple[bool, str]:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+        self._reader = None
+        self._writer = None
+        return (True, "Serial port " + self.port + " closed.")
+
+    async def _write(self, command: str) -> None:
+        async with self._io_lock:
+            self._writer.write(command.encode('ascii'))
+            await self._writer.drain()
+
+    async def _query(self, command: str) -> bytes:
+        # an empty reply stands for a timeout, like readline on a pyserial port
+        async with self._io_lock:
+            self._writer.write(command.encode('ascii'))
+            await self._writer.drain()
+            return await self._readline()
+
+    async def _query_batch(self, queries: List[str]) -> Tuple[bool, Union[str, List[str]]]:
+        command = ";".join(queries) + "\r"
+        values = []
+        async with self._io_lock:
+            self._writer.write(command.encode('ascii'))
+            await self._writer.drain()
+            while len(values) < len(queries):
+                response = await self._readline()
+                if response == b'':
+                    return (False, "Response timed out.")
+                values.extend([value.strip() for value in response.strip().decode('ascii').split(',')])
+
+        if len(values) != len(queries):
+            return (False, "Expected " + str(len(queries)) + " values but got: " + ",".join(values))
+        return (True, values)
+
+    async def _readline(self, timeout: Optional[float] = None) -> bytes:
+        if timeout is None:
+            timeout = self._timeout
+        try:
+            return await asyncio.wait_for(self._reader.readline(), timeout)
+        except asyncio.TimeoutError:
+            return b''
+
+    # a reply that turns up after its read timed out would be read as the answer to the next
+    # query, so everything that arrives until the port has been quiet for quiet_time is dropped
+    async def _discard_input(self, quiet_time: float) -> None:
+        while True:
+            try:
+                data = await asyncio.wait_for(self._reader.read(4096), quiet_time)
+            except asyncio.TimeoutError:
+                return
+            if not data:
+                return
+
+    @check_serial
+    async def initialize(self) -> Tuple[bool, str]:
+        was_successful, message = await self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+
+        commands = []
+        for axis in self._axis_list:
+            was_turned_on, message = await self.axis_on(axis)
+            if not was_turned_on:
+                self._is_initialized = False
+                return (was_turned_on, message)
+            commands.extend(self._parameter_commands(axis, 'SN', unit_mappings[self._units_list[axis-1]]))
+            commands.extend(self._parameter_commands(axis, 'SH', 0.0))
+            commands.extend(self._parameter_commands(axis, 'VU', self._max_speed_list[axis-1]))
+            commands.extend(self._parameter_commands(axis, 'VA', self._default_speed_list[axis-1]))
+        if commands:
+            await self._write(";".join(commands) + "\r")
+
+            was_successful, message = await self.check_error()
+            if not was_successful:
+                self._is_initialized = False
+                return (was_successful, message)
+
+        was_homed, message = await self.home_all()
+        if not was_homed:
+            self._is_initialized = False
+            return (was_homed, message)
+
+        self._is_initialized = True
+        return (True, "Successfully initialized axes by setting units to mm, settings max/current speeds, and homing. Current position set to zero.")
+
+    async def deinitialize(self, reset_init_flag: bool = True) -> Tuple[bool, str]:
+        was_zeroed, message = await self.move_multi_absolute({axis: 0.0 for axis in self._axis_list})
+        if not was_zeroed:
+            return (was_zeroed, message)
+
+        if reset_init_flag:
+            self._is_initialized = False
+        return (True, "Successfully deinitialized axes by moving to position zero.")
+
+    @check_serial
+    @check_axis_num
+    async def home(self, axis_number: int) -> Tuple[bool, str]:
+        return await self.home_all([axis_number])
+
+    @check_serial
+    async def home_all(self, axis_list: Optional[List[int]] = None) -> Tuple[bool, str]:
+        if axis_list is None:
+            axis_list = list(self._axis_list)
+        for axis_number in axis_list:
+            if not self.is_axis_num_valid(axis_number):
+                return (False, "Axis number " + str(axis_number) + " is not valid or not part of passed tuple during construction.")
+
+        self._start_motion({axis_number: self._home_position(axis_number) for axis_number in axis_list})
+        await self._write(";".join([str(axis) + "OR4" for axis in axis_list]) + "\r")
+        await self._wait_for_motion(list(self._axis_list), time.monotonic())
+        # pause one more time in case motor stopped moving but position has not been reset yet
+        await asyncio.sleep(self._poll_interval)
+        self._finish_motion(axis_list)
+
+        was_successful, message = await self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        return (True, "Successfully homed axes " + ", ".join([str(axis) for axis in axis_list]))
+
+    @check_serial
+    @check_initialized
+    @check_axis_num
+    async def move_speed_absolute(self, axis_number: int = 1, position: Optional[float] = None, speed: Optional[float] = None) -> Tuple[bool, str]:
+        if position is None:
+            return (False, "Position was not specified")
+        was_successful, speed = self._axis_speed(axis_number, speed)
+        if not was_successful:
+            return (was_successful, speed)
+        return await self._move_axes("PA", {axis_number: position}, {axis_number: speed})
+
+    @check_serial
+    @check_initialized
+    @check_axis_num
+    async def move_speed_relative(self, axis_number: int = 1, distance: Optional[float] = None, speed: Optional[float] = None) -> Tuple[bool, str]:
+        if distance is None:
+            return (False, "Distance was not specified")
+        was_successful, speed = self._axis_speed(axis_number, speed)
+        if not was_successful:
+            return (was_successful, speed)
+        return await self._move_axes("PR", {axis_number: distance}, {axis_number: speed})
+
+    @check_serial
+    @check_initialized
+    async def move_multi_absolute(self, positions: Dict[int, float], speeds: Optional[Dict[int, float]] = None) -> Tuple[bool, str]:
+        return await self._move_axes("PA", positions, speeds)
+
+    @check_serial
+    @check_initialized
+    async def move_multi_relative(self, distances: Dict[int, float], speeds: Optional[Dict[int, float]] = None) -> Tuple[bool, str]:
+        return await self._move_axes("PR", distances, speeds)
+
+    async def _move_axes(self, move_command: str, targets: Dict[int, float], speeds: Optional[Dict[int, float]] = None) -> Tuple[bool, str]:
+        if not targets:
+            return (False, "No axes were specified")
+        if speeds is None:
+            speeds = {}
+
+        was_successful, axis_speeds = self._axis_speeds(list(targets), speeds)
+        if not was_successful:
+            return (was_successful, axis_speeds)
+
+        estimated_time = None
+        if self._predictive_wait:
+            distances = dict(targets)
+            if move_command == "PA":
+                was_successful, start_positions = await self.positions(list(targets), cached=True)
+                if not was_successful:
+                    return (was_successful, start_positions)
+                distances = {axis: target - start_positions[axis] for axis, target in targets.items()}
+            for axis_number, distance in distances.items():
+                axis_time = await self.estimate_move_time(axis_number, distance, axis_speeds[axis_number])
+                if estimated_time is None or axis_time > estimated_time:
+                    estimated_time = axis_time
+
+        commands = []
+        for axis_number, speed in axis_speeds.items():
+            commands.extend(self._parameter_commands(axis_number, 'VA', speed))
+        commands.extend([self._format_move(axis_number, move_command, target) for axis_number, target in targets.items()])
+        if move_command == "PA":
+            self._start_motion(targets)
+        else:
+            self._start_motion(self._relative_targets(targets))
+        await self._write(";".join(commands) + "\r")
+        await self._wait_for_motion(list(targets), time.monotonic(), estimated_time)
+        self._finish_motion(list(targets))
+
+        was_successful, message = await self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        return (True, self._move_message(move_command, targets))
+
+    async def estimate_move_time(self, axis_number: int, distance: float, speed: float) -> float:
+        acceleration = await self._axis_parameter(axis_number, 'AC')
+        deceleration = await self._axis_parameter(axis_number, 'AG')
+        return self._profile_time(distance, speed, acceleration, deceleration)
+
+    async def _axis_parameter(self, axis_number: int, parameter: str) -> Optional[float]:
+        axis_parameters = self._parameter_cache.setdefault(axis_number, {})
+        if parameter not in axis_parameters:
+            response = await self._query(str(axis_number) + parameter + "?\r")
+            try:
+                axis_parameters[parameter] = float(response.strip().decode('ascii'))
+            except ValueError:
+                # includes timeout case
+                axis_parameters[parameter] = None
+        return axis_parameters[parameter]
+
+    # other coroutines keep running while this one sleeps through the move
+    async def _wait_for_motion(self, axis_list: List[int], start_time: float, estimated_time: Optional[float] = None) -> None:
+        if estimated_time is None:
+            poll_interval = self._poll_interval
+        else:
+            poll_interval = self._fine_poll_interval
+            remaining = start_time + estimated_time - self._wake_margin - time.monotonic()
+            if remaining > 0.0:
+                await asyncio.sleep(remaining)
+
+        while True:
+            was_successful, motion_done = await self.motion_done_all(axis_list)
+            if not was_successful or all(motion_done.values()):
+                # timeout case
+                return
+            await asyncio.sleep(poll_interval)
+
+    @check_serial
+    @check_axis_num
+    async def is_moving(self, axis_number: int = 1) -> bool:
+        response = await self._query(str(axis_number) + "MD?\r")
+        # MD? answers 0 while the axis is still moving, includes timeout case
+        return response.strip().decode('ascii') == '0'
+
+    @check_serial
+    async def motion_done_all(self, axis_list: Optional[List[int]] = None) -> Tuple[bool, Union[str, Dict[int, bool]]]:
+        if axis_list is None:
+            axis_list = list(self._axis_list)
+        was_successful, values = await self._query_batch([str(axis) + "MD?" for axis in axis_list])
+        if not was_successful:
+            return (was_successful, values)
+        return (True, {axis: value != '0' for axis, value in zip(axis_list, values)})
+
+    @check_serial
+    @check_axis_num
+    async def position(self, axis_number: int = 1, cached: bool = False) -> Tuple[bool, Union[str, float]]:
+        if cached and self._is_position_cached(axis_number):
+            return (True, self._confirmed_positions[axis_number])
+
+        motion_epoch = self._motion_epoch
+        position_str = await self._query(str(axis_number) + "TP\r")
+        if position_str == b'':
+            return (False, "Response timed out.")
+        try:
+            position = float(position_str.strip().decode('ascii'))
+        except ValueError:
+            return (False, "Invalid position response: " + position_str.strip().decode('ascii'))
+        self._confirm_positions({axis_number: position}, motion_epoch)
+        return (True, position)
+
+    @check_serial
+    async def positions(self, axis_list: Optional[List[int]] = None, cached: bool = False) -> Tuple[bool, Union[str, Dict[int, float]]]:
+        if axis_list is None:
+            axis_list = list(self._axis_list)
+        for axis_number in axis_list:
+            if not self.is_axis_num_valid(axis_number):
+                return (False, "Axis number " + str(axis_number) + " is not valid or not part of passed tuple during construction.")
+        if cached and all([self._is_position_cached(axis) for axis in axis_list]):
+            return (True, {axis: self._confirmed_positions[axis] for axis in axis_list})
+
+        motion_epoch = self._motion_epoch
+        was_successful, values = await self._query_batch([str(axis) + "TP" for axis in axis_list])
+        if not was_successful:
+            return (was_successful, values)
+        try:
+            positions = {axis: float(value) for axis, value in zip(axis_list, values)}
+        except ValueError:
+            return (False, "Invalid position response: " + ",".join(values))
+        self._confirm_positions(positions, motion_epoch)
+        return (True, positions)
+
+    @check_serial
+    async def check_error(self) -> Tuple[bool, str]:
+        response = await self._query("TB?\r")
+        if response == b'':
+            # the controller may not have applied the writes the parameter cache assumes
+            self._parameter_cache = {}
+            self.invalidate_positions()
+            await self._discard_input(0.05)
+            return (False, "Response timed out.")
+
+        response = response.strip().decode('ascii')
+        if response[0] == '0':
+            return (True, "No errors.")
+
+        # a move may have stopped short of its target
+        self._parameter_cache = {}
+        self.invalidate_positions()
+        # flush the error buffer, the first error is kept in front of whatever else was queued
+        self._last_errors = [self._parse_error(response)]
+        was_drained, errors = await self.drain_errors()
+        if was_drained:
+            self._last_errors.extend(errors)
+        return (False, response)
+
+    # empties the controller's error queue with short per-read deadlines so a missing reply
+    # costs read_timeout rather than the port timeout, and the whole drain at most time_budget
+    @check_serial
+    async def drain_errors(self, read_timeout: float = 0.05, time_budget: float = 0.5, max_errors: int = 10) -> Tuple[bool, Union[str, List[ESP301Error]]]:
+        errors = []
+        deadline = time.monotonic() + time_budget
+        is_empty = False
+        async with self._io_lock:
+            while len(errors) < max_errors and time.monotonic() < deadline:
+                self._writer.write(b"TB?\r")
+                await self._writer.drain()
+                response = await self._readline(min(read_timeout, max(0.0, deadline - time.monotonic())))
+                if response == b'':
+                    break
+                error = self._parse_error(response.strip().decode('ascii'))
+                if error.code == 0:
+                    is_empty = True
+                    break
+                errors.append(error)
+            if not is_empty:
+                await self._discard_input(read_timeout)
+
+        if not is_empty or errors:
+            self._parameter_cache = {}
+        if not is_empty:
+            return (False, "Error queue was not emptied within " + str(time_budget) + " s, read " + str(len(errors)) + " errors.")
+        return (True, errors)
+
+    @check_serial
+    @check_axis_num
+    async def axis_on(self, axis_number: int = 1) -> Tuple[bool, str]:
+        # the servo may pull the stage when the loop closes
+        self.invalidate_positions([axis_number])
+        self._moving_axes.discard(axis_number)
+        await self._write(str(axis_number) + "MO\r")
+
+        was_successful, message = await self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+
+        response = await self._query(str(axis_number) + "MO?\r")
+        return self._motor_result(axis_number, True, response)
+
+    @check_serial
+    @check_axis_num
+    async def axis_off(self, axis_number: int = 1) -> Tuple[bool, str]:
+        # an unpowered stage can be moved by hand, so it counts as moving until the motor is back on
+        self.invalidate_positions([axis_number])
+        self._moving_axes.add(axis_number)
+        await self._write(str(axis_number) + "MF\r")
+
+        was_successful, message = await self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+
+        response = await self._query(str(axis_number) + "MF?\r")
+        return self._motor_result(axis_number, False, response)
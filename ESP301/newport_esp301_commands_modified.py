@@ -1,6 +1,6 @@
 from .command import Command, CommandResult, CompositeCommand
-from devices.newport_esp301 import NewportESP301
-from typing import Optional
+from devices.newport_esp301 import NewportESP301, ESP301Move
+from typing import Dict, List, Optional, Tuple, Union
 
 # Parent class, subclass from Command ABC
 class NewportESP301ParentCommand(Command):
@@ -21,13 +21,14 @@ class NewportESP301Connect(NewportESP301ParentCommand):
         self._result = CommandResult(*self._receiver.start_serial())
 
 class NewportESP301Initialize(NewportESP301ParentCommand):
-    """Initialize the axes by homing them."""
+    """Initialize the axes by homing them (warm start only homes axes that lost their reference)."""
     
-    def __init__(self, receiver: NewportESP301, **kwargs):
+    def __init__(self, receiver: NewportESP301, warm_start: bool = False, **kwargs):
         super().__init__(receiver, **kwargs)
+        self._params['warm_start'] = warm_start
 
     def execute(self) -> None:
-        self._result = CommandResult(*self._receiver.initialize())
+        self._result = CommandResult(*self._receiver.initialize(self._params['warm_start']))
 
 class NewportESP301Deinitialize(NewportESP301ParentCommand):
     """Deinitialize the axes by moving them to position zero."""
@@ -64,6 +65,63 @@ class NewportESP301MoveSpeedRelative(NewportESP301ParentCommand):
     def execute(self) -> None:
         self._result = CommandResult(*self._receiver.move_speed_relative(self._params['axis_number'], self._params['distance'], self._params['speed']))
 
+class NewportESP301MoveMultiAbsolute(NewportESP301ParentCommand):
+    """Move several axes to absolute positions at the same time (No speed uses default speed)."""
+    
+    def __init__(self, receiver: NewportESP301, positions: Dict[int, float], speeds: Optional[Dict[int, float]] = None, **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['positions'] = positions
+        self._params['speeds'] = speeds
+    
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.move_multi_absolute(self._params['positions'], self._params['speeds']))
+
+class NewportESP301MoveMultiRelative(NewportESP301ParentCommand):
+    """Move several axes by relative distances at the same time (No speed uses default speed)."""
+    
+    def __init__(self, receiver: NewportESP301, distances: Dict[int, float], speeds: Optional[Dict[int, float]] = None, **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['distances'] = distances
+        self._params['speeds'] = speeds
+    
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.move_multi_relative(self._params['distances'], self._params['speeds']))
+
+class NewportESP301MoveQueue(NewportESP301ParentCommand):
+    """Visit a list of absolute targets back to back, dwelling at each point (No speed uses default speed)."""
+    
+    def __init__(self, receiver: NewportESP301, targets_list: List[Dict[int, float]], speeds: Optional[Dict[int, float]] = None, dwell: float = 0.0, **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['targets_list'] = targets_list
+        self._params['speeds'] = speeds
+        self._params['dwell'] = dwell
+    
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.move_queue(self._params['targets_list'], self._params['speeds'], self._params['dwell']))
+
+class NewportESP301FlyScan(NewportESP301ParentCommand):
+    """Move an axis from start to end at constant speed, reporting threshold crossings (No speed uses default speed)."""
+    
+    def __init__(self, receiver: NewportESP301, axis_number: int = 1, start: Optional[float] = None, end: Optional[float] = None, speed: Optional[float] = None, thresholds: Optional[List[float]] = None, **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['axis_number'] = axis_number
+        self._params['start'] = start
+        self._params['end'] = end
+        self._params['speed'] = speed
+        self._params['thresholds'] = thresholds
+    
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.fly_scan(self._params['axis_number'], self._params['start'], self._params['end'], self._params['speed'], self._params['thresholds']))
+
+class NewportESP301HomeAll(NewportESP301ParentCommand):
+    """Home every axis at the same time."""
+    
+    def __init__(self, receiver: NewportESP301, **kwargs):
+        super().__init__(receiver, **kwargs)
+
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.home_all())
+
 # # Example of command with additional logic to determine the returned tuple of (success/fail: bool, success/fail message: str)
 # class NewportESP301SetDefaultSpeed(NewportESP301ParentCommand):
 #     """Set the default speed of the axes."""
@@ -133,6 +191,93 @@ class NewportESP301GetAxisUnit(NewportESP301ParentCommand):
     def execute(self) -> None:
         self._result = CommandResult(*self._receiver.get_axis_unit(self._params['axis_number']))
 
+class NewportESP301GetPositions(NewportESP301ParentCommand):
+    """Get the position of several axes in one query (No axis list uses every axis, cached skips the query for idle axes)"""
+    
+    def __init__(self, receiver: NewportESP301, axis_list: Optional[List[int]] = None, cached: bool = False, **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['axis_list'] = axis_list
+        self._params['cached'] = cached
+
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.positions(self._params['axis_list'], self._params['cached']))
+
+class NewportESP301GetMotionDone(NewportESP301ParentCommand):
+    """Get whether motion is done on several axes in one query (No axis list uses every axis)"""
+    
+    def __init__(self, receiver: NewportESP301, axis_list: Optional[List[int]] = None, **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['axis_list'] = axis_list
+
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.motion_done_all(self._params['axis_list']))
+
+class NewportESP301CreateMotionGroup(NewportESP301ParentCommand):
+    """Define a group of axes that move together along straight lines"""
+    
+    def __init__(self, receiver: NewportESP301, group_number: int, axis_list: List[int], **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['group_number'] = group_number
+        self._params['axis_list'] = axis_list
+
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.create_motion_group(self._params['group_number'], self._params['axis_list']))
+
+class NewportESP301MoveGroupLinear(NewportESP301ParentCommand):
+    """Move a motion group along a straight line to the given positions (No speed uses the fastest default-speed path)"""
+    
+    def __init__(self, receiver: NewportESP301, group_number: int, positions: Dict[int, float], speed: Optional[float] = None, **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['group_number'] = group_number
+        self._params['positions'] = positions
+        self._params['speed'] = speed
+
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.move_group_linear(self._params['group_number'], self._params['positions'], self._params['speed']))
+
+class NewportESP301UploadProgram(NewportESP301ParentCommand):
+    """Store a sequence of moves as a program on the controller"""
+    
+    def __init__(self, receiver: NewportESP301, program_number: int, moves: List[ESP301Move], **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['program_number'] = program_number
+        self._params['moves'] = moves
+
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.upload_program(self._params['program_number'], self._params['moves']))
+
+class NewportESP301ExecuteProgram(NewportESP301ParentCommand):
+    """Run a stored program and wait for it to finish"""
+    
+    def __init__(self, receiver: NewportESP301, program_number: int, **kwargs):
+        super().__init__(receiver, **kwargs)
+        self._params['program_number'] = program_number
+
+    def execute(self) -> None:
+        self._result = CommandResult(*self._receiver.execute_program(self._params['program_number']))
+
+# Turns move commands (e.g. the children of a composite) into steps for upload_program,
+# (True, moves) or (False, message) for a command that can not be stored
+def program_moves(commands: List[NewportESP301ParentCommand]) -> Tuple[bool, Union[str, List[ESP301Move]]]:
+    moves = []
+    for command in commands:
+        params = command._params
+        if isinstance(command, NewportESP301MoveSpeedAbsolute):
+            if params['position'] is None:
+                return (False, "Position was not specified")
+            moves.append(ESP301Move('PA', {params['axis_number']: params['position']}, {params['axis_number']: params['speed']}))
+        elif isinstance(command, NewportESP301MoveSpeedRelative):
+            if params['distance'] is None:
+                return (False, "Distance was not specified")
+            moves.append(ESP301Move('PR', {params['axis_number']: params['distance']}, {params['axis_number']: params['speed']}))
+        elif isinstance(command, NewportESP301MoveMultiAbsolute):
+            moves.append(ESP301Move('PA', params['positions'], params['speeds']))
+        elif isinstance(command, NewportESP301MoveMultiRelative):
+            moves.append(ESP301Move('PR', params['distances'], params['speeds']))
+        else:
+            return (False, type(command).__name__ + " can not be stored in an ESP301 program.")
+    return (True, moves)
+
 # Derived commands
 class NewportESP301HorzMoveSpeedAbsolute(NewportESP301MoveSpeedAbsolute):
     """desc"""
@@ -0,0 +1,139 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .newport_esp301 import NewportESP301
+
+
+# every controller gets its own single worker thread, so calls on one controller still run one
+# at a time in the order they were submitted while different controllers run side by side
+class ESP301Fleet:
+    """Several ESP301 controllers on separate ports driven in parallel."""
+
+    def __init__(self, controllers: Dict[str, NewportESP301]):
+        self._controllers = dict(controllers)
+        self._workers = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix="ESP301 " + name) for name in self._controllers}
+        # futures submitted since the last wait_all, by controller name
+        self._pending: Dict[str, List[Future]] = {name: [] for name in self._controllers}
+        # position snapshots do not queue behind moves, the driver's serial lock lets them
+        # share the port with a move that is waiting for motion to end
+        self._readers = ThreadPoolExecutor(max_workers=max(1, len(self._controllers)), thread_name_prefix="ESP301 fleet reader")
+
+    @property
+    def controllers(self) -> Dict[str, NewportESP301]:
+        return self._controllers
+
+    def __getitem__(self, name: str) -> NewportESP301:
+        return self._controllers[name]
+
+    def submit(self, name: str, method: str, *args, **kwargs) -> Future:
+        # runs getattr(controller, method)(*args, **kwargs) on that controller's worker
+        func: Callable[..., Any] = getattr(self._controllers[name], method)
+        future = self._workers[name].submit(func, *args, **kwargs)
+        self._pending[name].append(future)
+        return future
+
+    def submit_all(self, method: str, *args, **kwargs) -> Dict[str, Future]:
+        return {name: self.submit(name, method, *args, **kwargs) for name in self._controllers}
+
+    def wait_all(self, timeout: Optional[float] = None) -> Tuple[bool, Union[str, Dict[str, List[Tuple[bool, str]]]]]:
+        # waits for everything submitted since the last wait_all, results are per controller in
+        # submission order, fails if any call failed or raised. on a timeout nothing is
+        # forgotten, the next wait_all collects the same futures again
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results: Dict[str, List[Tuple[bool, str]]] = {}
+        failures = []
+        timed_out = []
+        for name, futures in self._pending.items():
+            results[name] = []
+            for future in futures:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    result = future.result(remaining)
+                except TimeoutError:
+                    timed_out.append(name)
+                    break
+                except Exception as e:
+                    result = (False, repr(e))
+                results[name].append(result)
+                if not result[0]:
+                    failures.append(name + ": " + str(result[1]))
+
+        if timed_out:
+            return (False, "Controllers " + ", ".join(timed_out) + " did not finish within " + str(timeout) + " s.")
+        for futures in self._pending.values():
+            futures.clear()
+        if failures:
+            return (False, "; ".join(failures))
+        return (True, results)
+
+    def start_serial_all(self) -> Tuple[bool, Union[str, Dict[str, List[Tuple[bool, str]]]]]:
+        self.submit_all('start_serial')
+        return self.wait_all()
+
+    def initialize_all(self, warm_start: bool = False) -> Tuple[bool, Union[str, Dict[str, List[Tuple[bool, str]]]]]:
+        self.submit_all('initialize', warm_start)
+        return self.wait_all()
+
+    def home_all(self, axis_lists: Optional[Dict[str, List[int]]] = None) -> Tuple[bool, Union[str, Dict[str, List[Tuple[bool, str]]]]]:
+        # axis_lists picks the axes per controller, controllers left out home every axis
+        if axis_lists is None:
+            axis_lists = {}
+        for name in self._controllers:
+            self.submit(name, 'home_all', axis_lists.get(name))
+        return self.wait_all()
+
+    def move_absolute(
+            self,
+            positions: Dict[str, Dict[int, float]],
+            speeds: Optional[Dict[str, Dict[int, float]]] = None,
+            wait: bool = True) -> Tuple[bool, Union[str, Dict[str, List[Tuple[bool, str]]], Dict[str, Future]]]:
+        # one multi-axis move per controller, with wait=False the futures are returned and
+        # wait_all collects the results
+        return self._move('move_multi_absolute', positions, speeds, wait)
+
+    def move_relative(
+            self,
+            distances: Dict[str, Dict[int, float]],
+            speeds: Optional[Dict[str, Dict[int, float]]] = None,
+            wait: bool = True) -> Tuple[bool, Union[str, Dict[str, List[Tuple[bool, str]]], Dict[str, Future]]]:
+        return self._move('move_multi_relative', distances, speeds, wait)
+
+    def _move(
+            self,
+            method: str,
+            targets: Dict[str, Dict[int, float]],
+            speeds: Optional[Dict[str, Dict[int, float]]],
+            wait: bool) -> Tuple[bool, Union[str, Dict[str, List[Tuple[bool, str]]], Dict[str, Future]]]:
+        if speeds is None:
+            speeds = {}
+        for name in targets:
+            if name not in self._controllers:
+                return (False, "Controller " + name + " is not part of the fleet.")
+        futures = {name: self.submit(name, method, axis_targets, speeds.get(name)) for name, axis_targets in targets.items()}
+        if not wait:
+            return (True, futures)
+        return self.wait_all()
+
+    def positions(self, cached: bool = False, timeout: Optional[float] = 10.0) -> Tuple[bool, Union[str, Dict[str, Dict[int, float]]]]:
+        # every controller is queried at once, so the snapshot takes one round trip however many there are
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = {name: self._readers.submit(controller.positions, None, cached) for name, controller in self._controllers.items()}
+        snapshot = {}
+        for name, future in futures.items():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                was_successful, positions = future.result(remaining)
+            except TimeoutError:
+                return (False, "Controller " + name + " did not report positions within " + str(timeout) + " s.")
+            except Exception as e:
+                return (False, "Controller " + name + ": " + repr(e))
+            if not was_successful:
+                return (False, "Controller " + name + ": " + positions)
+            snapshot[name] = positions
+        return (True, snapshot)
+
+    def shutdown(self) -> None:
+        for worker in self._workers.values():
+            worker.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
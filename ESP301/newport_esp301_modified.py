@@ -1,6 +1,8 @@
 import time
-from typing import List, Optional, Tuple, Union
+import math
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
 import functools
+import threading
 
 from .device import SerialDevice, check_initialized, check_serial
 
@@ -14,12 +16,283 @@ def check_axis_num(func):
         else:
             axis_number = args[0]
             
-        if not self.is_axis_num_valid(axis_number):
+        trace_span = getattr(self, '_trace_span', None)
+        if trace_span is None:
+            is_valid = self.is_axis_num_valid(axis_number)
+        else:
+            # set by tracing.trace_device
+            with trace_span("check_axis_num", "check") as check_span:
+                is_valid = self.is_axis_num_valid(axis_number)
+                check_span.args['is_valid'] = is_valid
+        if not is_valid:
             return (False, "Axis number is not valid or not part of passed tuple during construction.")
         return func(self, *args, **kwargs)
     return wrapper
 
-class NewportESP301(SerialDevice):
+# per-axis settings as read back from the controller, units are the axis unit
+class ESP301AxisConfig(NamedTuple):
+    unit: str           # SN, unit code as sent to the controller
+    home_preset: float  # SH
+    max_speed: float    # VU
+    speed: float        # VA
+    acceleration: float # AC
+    deceleration: float # AG
+    max_acceleration: float # AU
+    motor_on: bool      # MO
+
+# one step of a stored program: all targets start together, then the program waits
+# for those axes to stop and dwells for the given number of seconds
+class ESP301Move(NamedTuple):
+    move_command: str   # 'PA' absolute or 'PR' relative
+    targets: Dict[int, float]
+    speeds: Optional[Dict[int, float]] = None
+    dwell: float = 0.0
+
+# reported by fly_scan when the stage crosses a threshold, timestamp is time.monotonic()
+# interpolated between the two position samples around the crossing
+class ESP301CrossingEvent(NamedTuple):
+    index: int          # index into the thresholds passed to fly_scan
+    threshold: float
+    position: float     # first sampled position past the threshold
+    timestamp: float
+
+# one entry of the controller's error queue as reported by TB?, axis errors are coded
+# as axis number * 100 + error number
+class ESP301Error(NamedTuple):
+    code: int
+    timestamp: int
+    message: str
+
+# reported when erasing a program or deleting a motion group that does not exist
+PROGRAM_NOT_FOUND_ERROR = 35
+GROUP_NOT_ASSIGNED_ERROR = 15
+
+unit_mappings = {
+            'encoder count': '0',
+            'motor step': '1',
+            'millimeter': '2',
+            'micrometer': '3',
+            'inches': '4',
+            'milli-inches': '5',
+            'micro-inches': '6',
+            'degree': '7',
+            'gradian': '8',
+            'radian': '9',
+            'milliradian': '10',
+            'microradian': '11',
+        }
+
+# unit name for each SN code
+unit_names = {code: unit for unit, code in unit_mappings.items()}
+
+# how far a reported DP may be from the target computed by the driver and still count as the
+# same position, the controller rounds targets to its resolution which is one count or step
+# on the raw units and about a micrometer or a millidegree on the rest
+position_tolerances = {
+            'encoder count': 1.0,
+            'motor step': 1.0,
+            'millimeter': 1e-3,
+            'micrometer': 1.0,
+            'inches': 5e-5,
+            'milli-inches': 5e-2,
+            'micro-inches': 50.0,
+            'degree': 1e-3,
+            'gradian': 1e-3,
+            'radian': 2e-5,
+            'milliradian': 2e-2,
+            'microradian': 20.0,
+        }
+
+# everything that does not touch the port: argument checks, the parameter and position caches
+# and the command and reply formats, shared by NewportESP301 and NewportESP301Async so the two
+# drivers validate, cache and answer the same way. expects _axis_list, _default_speed_list and
+# _max_speed_list on the instance and _init_caches() to be called from __init__
+class ESP301Core:
+    """Port-free part of the ESP301 drivers."""
+
+    def _init_caches(self) -> None:
+        # shadow copy of the controller's per-axis parameters ('VA', 'VU', 'SN', 'AC', 'AG', 'AU', ...)
+        # so writes of values the controller already has can be skipped
+        self._parameter_cache: Dict[int, Dict[str, Union[str, float, None]]] = {}
+        self._last_errors: List[ESP301Error] = []
+        # target of the last move sent to each axis, and the position it was last seen idle at,
+        # so position(cached=True) can answer without a TP query while the axis is not moving
+        self._commanded_positions: Dict[int, float] = {}
+        self._confirmed_positions: Dict[int, float] = {}
+        self._moving_axes: Set[int] = set()
+        # bumped whenever motion starts or ends, a TP reply is only kept if nothing changed while it was read
+        self._motion_epoch = 0
+
+    def is_axis_num_valid(self, axis_number: int) -> bool:
+        if axis_number in self._axis_list:
+            return True
+        else:
+            return False
+
+    # speed for a single-axis move, (True, speed) or (False, message)
+    def _axis_speed(self, axis_number: int, speed: Optional[float]) -> Tuple[bool, Union[str, float]]:
+        if speed is None:
+            speed = self._default_speed_list[axis_number-1]
+        # ensure speed is within bounds
+        if speed <= 0.0 or speed > self._max_speed_list[axis_number-1]:
+            return (False, "Speed is out of bounds.")
+        return (True, speed)
+
+    # speeds for a multi-axis move, (True, {axis: speed}) or (False, message)
+    def _axis_speeds(self, axis_list: List[int], speeds: Dict[int, float]) -> Tuple[bool, Union[str, Dict[int, float]]]:
+        axis_speeds = {}
+        for axis_number in axis_list:
+            if not self.is_axis_num_valid(axis_number):
+                return (False, "Axis number " + str(axis_number) + " is not valid or not part of passed tuple during construction.")
+            was_successful, speed = self._axis_speed(axis_number, speeds.get(axis_number))
+            if not was_successful:
+                return (False, "Speed is out of bounds for axis " + str(axis_number) + ".")
+            axis_speeds[axis_number] = speed
+        return (True, axis_speeds)
+
+    # returns the write needed to set a parameter, or nothing if the controller already has the value
+    # the cache is updated right away and dropped by check_error if the write fails
+    def _parameter_commands(self, axis_number: int, parameter: str, value: Union[str, float]) -> List[str]:
+        axis_parameters = self._parameter_cache.setdefault(axis_number, {})
+        if parameter in axis_parameters and axis_parameters[parameter] == value:
+            return []
+        axis_parameters[parameter] = value
+        return [str(axis_number) + parameter + str(value)]
+
+    # errors read by the last check_error that found one, oldest first
+    @property
+    def last_errors(self) -> List[ESP301Error]:
+        return self._last_errors
+
+    @property
+    def commanded_positions(self) -> Dict[int, float]:
+        return self._commanded_positions
+
+    # drops the cached positions, call after jogging an axis from the front panel or by hand
+    # since the driver cannot see that motion
+    def invalidate_positions(self, axis_list: Optional[List[int]] = None) -> None:
+        if axis_list is None:
+            axis_list = list(self._commanded_positions) + list(self._confirmed_positions)
+        for axis_number in axis_list:
+            self._commanded_positions.pop(axis_number, None)
+            self._confirmed_positions.pop(axis_number, None)
+
+    def _is_position_cached(self, axis_number: int) -> bool:
+        return axis_number in self._confirmed_positions and axis_number not in self._moving_axes
+
+    # a target of None marks an axis whose end position is not known, e.g. a relative
+    # move from an unknown position
+    def _start_motion(self, targets: Dict[int, Optional[float]]) -> None:
+        self._motion_epoch += 1
+        for axis_number, target in targets.items():
+            self._moving_axes.add(axis_number)
+            self._confirmed_positions.pop(axis_number, None)
+            if target is None:
+                self._commanded_positions.pop(axis_number, None)
+            else:
+                self._commanded_positions[axis_number] = target
+
+    # the axes are idle at their commanded positions, check_error drops them again if the move failed
+    def _finish_motion(self, axis_list: List[int]) -> None:
+        self._motion_epoch += 1
+        for axis_number in axis_list:
+            self._moving_axes.discard(axis_number)
+            if axis_number in self._commanded_positions:
+                self._confirmed_positions[axis_number] = self._commanded_positions[axis_number]
+
+    # keeps positions read from idle axes, unless a move started or ended while they were read
+    def _confirm_positions(self, positions: Dict[int, float], motion_epoch: int) -> None:
+        if motion_epoch != self._motion_epoch:
+            return
+        for axis_number, position in positions.items():
+            if axis_number not in self._moving_axes:
+                self._confirmed_positions[axis_number] = position
+
+    # targets of a relative move, None where the start is not known
+    def _relative_targets(self, distances: Dict[int, float]) -> Dict[int, Optional[float]]:
+        return {axis_number: self._commanded_positions[axis_number] + distance if axis_number in self._commanded_positions else None for axis_number, distance in distances.items()}
+
+    def _home_position(self, axis_number: int) -> Optional[float]:
+        # homing sets the position to the home preset
+        home_preset = self._parameter_cache.get(axis_number, {}).get('SH')
+        if home_preset is None:
+            return None
+        return float(home_preset)
+
+    @staticmethod
+    def _format_move(axis_number: int, move_command: str, target: float) -> str:
+        if target >= 0.0:
+            sign = "+"
+        else:
+            sign = "-"
+        return str(axis_number) + move_command + sign + str(abs(target))
+
+    @staticmethod
+    def _move_message(move_command: str, targets: Dict[int, float]) -> str:
+        if len(targets) == 1:
+            target = str(list(targets.values())[0])
+        else:
+            target = str(targets)
+        if move_command == "PA":
+            return "Successfully completed absolute move at " + target
+        else:
+            return "Successfully completed relative move by " + target
+
+    # result of axis_on / axis_off from the MO? or MF? reply, which is '1' while the motor is on
+    @staticmethod
+    def _motor_result(axis_number: int, turn_on: bool, response: bytes) -> Tuple[bool, str]:
+        state = "ON" if turn_on else "OFF"
+        if response.strip().decode('ascii') == ('1' if turn_on else '0'):
+            return (True, "Axis " + str(axis_number) + " motor successfully turned " + state + ".")
+        else:
+            # also means timeout
+            return (False, "Axis " + str(axis_number) + " motor failed to turned " + state + ".")
+
+    @staticmethod
+    def _profile_time(distance: float, speed: float, acceleration: Optional[float], deceleration: Optional[float] = None) -> float:
+        return float(ESP301Core._profile_times(distance, speed, acceleration, deceleration))
+
+    # trapezoidal velocity profile, moves too short to reach the commanded speed follow a
+    # triangular profile that peaks where the two ramps meet. works elementwise on arrays so
+    # the planner can time whole maps at once, a missing (None or NaN) or non-positive
+    # acceleration means the move is timed without ramps
+    @staticmethod
+    def _profile_times(distance, speed, acceleration, deceleration=None) -> "numpy.ndarray":
+        import numpy as np
+        distance = np.abs(np.asarray(distance, dtype=float))
+        speed = np.asarray(speed, dtype=float)
+        acceleration = np.asarray(acceleration, dtype=float)
+        if deceleration is None:
+            deceleration = acceleration
+        deceleration = np.asarray(deceleration, dtype=float)
+        has_ramps = acceleration > 0.0
+        deceleration = np.where(deceleration > 0.0, deceleration, acceleration)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 1/acceleration + 1/deceleration, ramping up to speed and back down covers speed**2 / 2 * ramp_factor
+            ramp_factor = np.where(has_ramps, 1.0 / acceleration + 1.0 / deceleration, 0.0)
+            is_triangular = has_ramps & (distance < speed * speed / 2.0 * ramp_factor)
+            peak_speed = np.sqrt(2.0 * distance / ramp_factor)
+            triangular_time = peak_speed * ramp_factor
+            trapezoidal_time = distance / speed + speed * ramp_factor / 2.0
+        return np.where(is_triangular, triangular_time, trapezoidal_time)
+
+    @staticmethod
+    def _parse_error(response: str) -> ESP301Error:
+        # TB? answers "<code>, <timestamp>, <message>"
+        fields = [field.strip() for field in response.split(',', 2)]
+        try:
+            code = int(fields[0])
+        except ValueError:
+            return ESP301Error(-1, 0, response)
+        try:
+            timestamp = int(fields[1])
+        except (IndexError, ValueError):
+            timestamp = 0
+        message = fields[2] if len(fields) > 2 else ""
+        return ESP301Error(code, timestamp, message)
+
+class NewportESP301(SerialDevice, ESP301Core):
     def __init__(
             self, 
             name: str,
@@ -31,7 +304,15 @@ class NewportESP301(SerialDevice):
             default_speed_list: List[float] = [10.0, 10.0, 10.0],
             max_speed_list: List[float] = [100.0, 40.0, 20.0],
             units_list: List[str] = ['millimeter', 'millimeter', 'degree'],
-            poll_interval: float = 0.1):
+            poll_interval: float = 0.1,
+            predictive_wait: bool = True,
+            wake_margin: float = 0.02,
+            fine_poll_interval: float = 0.005,
+            pipeline_commands: bool = False,
+            acceleration_list: Optional[List[float]] = None,
+            deceleration_list: Optional[List[float]] = None,
+            max_acceleration_list: Optional[List[float]] = None,
+            short_move_threshold_list: Optional[List[float]] = None):
 
         super().__init__(name, port, baudrate, timeout)
         self._axis_list = axis_list
@@ -41,6 +322,34 @@ class NewportESP301(SerialDevice):
         #self._max_speed = 200.0 # make list
         self._max_speed_list = max_speed_list
         self._units_list = units_list
+        # predictive motion-completion waiting: sleep until just before the estimated
+        # end of the move, then poll MD? at fine_poll_interval
+        self._predictive_wait = predictive_wait
+        self._wake_margin = wake_margin
+        self._fine_poll_interval = fine_poll_interval
+        self._move_time_stats: Dict[int, Dict[str, float]] = {}
+        self._home_time_stats: Dict[int, Dict[str, float]] = {}
+        # pipeline mode: parameter changes and speed settings are sent on the same
+        # line as the next move and the error queue is only checked once at the end
+        self._pipeline_commands = pipeline_commands
+        self._pending_commands: List[str] = []
+        self._init_caches()
+        # moves of every program uploaded to the controller during this session, by program number
+        self._programs: Dict[int, List[ESP301Move]] = {}
+        self._serial_lock = threading.RLock()
+        # samples per download of the on-board data acquisition buffer, None until configured
+        self._data_gathering_count: Optional[int] = None
+        # axes of every motion group defined on the controller, by group number
+        self._motion_groups: Dict[int, List[int]] = {}
+        # None keeps whatever the controller has, deceleration defaults to the acceleration
+        self._acceleration_list = acceleration_list
+        self._deceleration_list = deceleration_list
+        self._max_acceleration_list = max_acceleration_list
+        # moves shorter than the threshold run at the maximum acceleration when both lists are set
+        self._short_move_threshold_list = short_move_threshold_list
+        self._short_move_time_saved = 0.0
+        # configuration read back at the last initialize, the base ramps come from here when no lists are given
+        self._axis_configs: Dict[int, ESP301AxisConfig] = {}
 
     # @property
     # def default_speed(self) -> float:
@@ -71,60 +380,120 @@ class NewportESP301(SerialDevice):
     # check_error already has serial check
     # easier to just set is_intialized False at the very beginning
     # do for all receivers
-    def initialize(self) -> Tuple[bool, str]:
+    # warm_start skips homing axes that are still referenced from an earlier session
+    def initialize(self, warm_start: bool = False) -> Tuple[bool, str]:
         # if not self.ser.is_open:
         #     return (False, "Serial port " + self._port + " is not open. ")
 
-        unit_mappings = {
-                    'encoder count': '0', 
-                    'motor step': '1',
-                    'millimeter': '2',
-                    'micrometer': '3',
-                    'inches': '4',
-                    'milli-inches': '5', 
-                    'micro-inches': '6',
-                    'degree': '7',
-                    'gradian': '8',
-                    'radian': '9',
-                    'milliradian': '10',
-                    'microradian': '11',
-                }
-
         was_successful, message = self.check_error() # just used to flush error and serial input buffer if there is an error
         if not was_successful:
             return (was_successful, message)
 
-        self.ser.reset_input_buffer() # flush the serial input buffer even if there was no error
+        with self._serial_lock:
+            self.ser.reset_input_buffer() # flush the serial input buffer even if there was no error
+        self._parameter_cache = {}
+        self.invalidate_positions()
 
+        # read what the controller already has so only the settings that differ get written
+        was_successful, configs = self.read_axis_configs()
+        if not was_successful:
+            self._is_initialized = False
+            return (was_successful, configs)
+
+        # the controller powers up with every motor off and turns a motor off on a following
+        # error or limit fault, so an axis whose motor is still on in the expected unit with
+        # a zero home preset has not lost its reference since it was last homed
+        homed_axes = []
+        if warm_start:
+            for axis in self._axis_list:
+                config = configs[axis]
+                if config.motor_on and config.unit == unit_mappings[self._units_list[axis-1]] and config.home_preset == 0.0:
+                    homed_axes.append(axis)
+
+        commands = []
         for axis in self._axis_list:
             # Make sure axis motor is turned on
-            was_turned_on, message = self.axis_on(axis)
-            if not was_turned_on:
-                self._is_initialized = False
-                return (was_turned_on, message)
-            # set units to mm, homing value to 0, set max speed, set current speed 
+            if not configs[axis].motor_on:
+                was_turned_on, message = self.axis_on(axis)
+                if not was_turned_on:
+                    self._is_initialized = False
+                    return (was_turned_on, message)
+            # set units, homing value to 0, set max speed, set current speed 
             #command = str(axis) + "SN2;" + str(axis) + "SH0;" + str(axis) + "VU" + str(self._max_speed) + ";" + str(axis) + "VA" + str(self.default_speed) + "\r"
-            unit = unit_mappings[self._units_list[axis-1]]
-            max_speed = str(self._max_speed_list[axis-1])
-            default_speed = str(self._default_speed_list[axis-1])
-            command = str(axis) + "SN" + unit + ";" + str(axis) + "SH0;" + str(axis) + "VU" + max_speed + ";" + str(axis) + "VA" + default_speed + "\r"
-            self.ser.write(command.encode('ascii'))
+            unit_commands = self._parameter_commands(axis, 'SN', unit_mappings[self._units_list[axis-1]])
+            if unit_commands:
+                # speeds and ramps read back in the old unit do not carry over
+                self._parameter_cache[axis] = {'SN': unit_mappings[self._units_list[axis-1]]}
+                self.invalidate_positions([axis])
+                self._axis_configs.pop(axis, None)
+            commands.extend(unit_commands)
+            commands.extend(self._parameter_commands(axis, 'SH', 0.0))
+            commands.extend(self._parameter_commands(axis, 'VU', self._max_speed_list[axis-1]))
+            commands.extend(self._parameter_commands(axis, 'VA', self._default_speed_list[axis-1]))
+            # the maximum goes first, the controller rejects ramps above it
+            if self._max_acceleration_list is not None:
+                commands.extend(self._parameter_commands(axis, 'AU', self._max_acceleration_list[axis-1]))
+            acceleration, deceleration = self._base_ramps(axis)
+            if acceleration is not None:
+                commands.extend(self._parameter_commands(axis, 'AC', acceleration))
+            if deceleration is not None:
+                commands.extend(self._parameter_commands(axis, 'AG', deceleration))
+
+        if commands:
+            self._write_commands(commands)
+
+            # Make sure initialization of settings was successful
+            was_successful, message = self.check_error()
+            if not was_successful:
+                self._is_initialized = False
+                return (was_successful, message)
 
-        # Make sure initialization of settings was successful
-        was_successful, message = self.check_error()
-        if not was_successful:
+        was_homed, message = self.home_all([axis for axis in self._axis_list if axis not in homed_axes])
+        if not was_homed:
             self._is_initialized = False
-            return (was_successful, message)
-
-        for axis in self._axis_list:
-            was_homed, message = self.home(axis)
-            if not was_homed:
-                self._is_initialized = False
-                return (was_homed, message)
+            return (was_homed, message)
     
         self._is_initialized = True
+        if homed_axes:
+            return (True, "Successfully initialized axes by setting units, settings max/current speeds, and homing. Axes " + ", ".join([str(axis) for axis in homed_axes]) + " were already referenced and kept their position.")
         return (True, "Successfully initialized axes by setting units to mm, settings max/current speeds, and homing. Current position set to zero.")
 
+    # reads every axis' configuration in one exchange and seeds the parameter cache with it
+    @check_serial
+    def read_axis_configs(self) -> Tuple[bool, Union[str, Dict[int, ESP301AxisConfig]]]:
+        parameters = ['SN', 'SH', 'VU', 'VA', 'AC', 'AG', 'AU', 'MO']
+        queries = [str(axis) + parameter + "?" for axis in self._axis_list for parameter in parameters]
+        was_successful, values = self._query_batch(queries)
+        if not was_successful:
+            return (was_successful, values)
+
+        configs = {}
+        for ndx, axis in enumerate(self._axis_list):
+            axis_values = values[ndx*len(parameters):(ndx+1)*len(parameters)]
+            try:
+                configs[axis] = ESP301AxisConfig(
+                    unit=str(int(axis_values[0])),
+                    home_preset=float(axis_values[1]),
+                    max_speed=float(axis_values[2]),
+                    speed=float(axis_values[3]),
+                    acceleration=float(axis_values[4]),
+                    deceleration=float(axis_values[5]),
+                    max_acceleration=float(axis_values[6]),
+                    motor_on=axis_values[7] == '1')
+            except ValueError:
+                return (False, "Invalid configuration response for axis " + str(axis) + ": " + ",".join(axis_values))
+            self._parameter_cache[axis] = {
+                'SN': configs[axis].unit,
+                'SH': configs[axis].home_preset,
+                'VU': configs[axis].max_speed,
+                'VA': configs[axis].speed,
+                'AC': configs[axis].acceleration,
+                'AG': configs[axis].deceleration,
+                'AU': configs[axis].max_acceleration,
+            }
+            self._axis_configs[axis] = configs[axis]
+        return (True, configs)
+
     # move_speed_absolute already has serial check
     def deinitialize(self, reset_init_flag: bool = True) -> Tuple[bool, str]:
         # if not self.ser.is_open:
@@ -140,17 +509,24 @@ class NewportESP301(SerialDevice):
 
         return (True, "Successfully deinitialized axes by moving to position zero.")
 
-    # make a home_all function
     @check_serial
     def home(self, axis_number: int) -> Tuple[bool, str]:
         # if not self.ser.is_open:
         #     return (False, "Serial port " + self._port + " is not open. ")
 
         command = str(axis_number) + "OR4\r"
-        self.ser.write(command.encode('ascii'))
-
-        while self.is_any_moving():
-            time.sleep(self._poll_interval)
+        self._start_motion({axis_number: self._home_position(axis_number)})
+        self._write(command)
+        start_time = time.monotonic()
+
+        # homing time depends on where the axis was left, so only previous homes can predict it
+        estimated_time = None
+        if axis_number in self._home_time_stats:
+            estimated_time = self._home_time_stats[axis_number]['min']
+
+        elapsed_time = self._wait_for_motion(list(self._axis_list), start_time, estimated_time)
+        self._finish_motion([axis_number])
+        self._record_home_time(axis_number, elapsed_time)
         # pause one more time in case motor stopped moving but position has not been reset yet     
         time.sleep(self._poll_interval)
 
@@ -160,11 +536,50 @@ class NewportESP301(SerialDevice):
         else:
             return (True, "Successfully homed axes " + str(axis_number))
 
+    # sends every OR4 in one line so all axes home at the same time
+    @check_serial
+    def home_all(self, axis_list: Optional[List[int]] = None) -> Tuple[bool, str]:
+        if axis_list is None:
+            axis_list = list(self._axis_list)
+        for axis_number in axis_list:
+            if not self.is_axis_num_valid(axis_number):
+                return (False, "Axis number " + str(axis_number) + " is not valid or not part of passed tuple during construction.")
+        if not axis_list:
+            return (True, "No axes to home.")
+
+        command = ";".join([str(axis) + "OR4" for axis in axis_list]) + "\r"
+        self._start_motion({axis: self._home_position(axis) for axis in axis_list})
+        self._write(command)
+        start_time = time.monotonic()
+
+        # axis 0 holds the timing of homing every axis together, other subsets are not predicted
+        stats_key = None
+        if len(axis_list) == 1:
+            stats_key = axis_list[0]
+        elif sorted(axis_list) == sorted(self._axis_list):
+            stats_key = 0
+        estimated_time = None
+        if stats_key in self._home_time_stats:
+            estimated_time = self._home_time_stats[stats_key]['min']
+
+        elapsed_time = self._wait_for_motion(list(self._axis_list), start_time, estimated_time)
+        self._finish_motion(axis_list)
+        if stats_key is not None:
+            self._record_home_time(stats_key, elapsed_time)
+        # pause one more time in case motor stopped moving but position has not been reset yet
+        time.sleep(self._poll_interval)
+
+        was_successful, message = self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        else:
+            return (True, "Successfully homed axes " + ", ".join([str(axis) for axis in axis_list]))
+
     # Consider a decorator for checks?
     @check_serial
     @check_initialized
     @check_axis_num
-    def move_speed_absolute(self, axis_number: int = 1, position: Optional[float] = None, speed: Optional[float] = None) -> Tuple[bool, str]:
+    def move_speed_absolute(self, axis_number: int = 1, position: Optional[float] = None, speed: Optional[float] = None, acceleration: Optional[float] = None, deceleration: Optional[float] = None) -> Tuple[bool, str]:
         # if not self.ser.is_open:
         # #     return (False, "Serial port " + self._port + " is not open. ")
         # if not self.is_axis_num_valid(axis_number):
@@ -177,135 +592,805 @@ class NewportESP301(SerialDevice):
         if position is None:
             return (False, "Position was not specified")
 
-        if speed is None:
-            speed = self._default_speed_list[axis_number-1]
-            #speed = self._default_speed
+        was_successful, speed = self._axis_speed(axis_number, speed)
+        if not was_successful:
+            return (was_successful, speed)
 
-        # ensure speed is within bounds
-        if speed <= 0.0 or speed > self._max_speed_list[axis_number-1]:
-            return (False, "Speed is out of bounds.")
+        return self._move_axes("PA", {axis_number: position}, {axis_number: speed}, self._ramp_dict(axis_number, acceleration), self._ramp_dict(axis_number, deceleration))
 
-        command = str(axis_number) + "VA" + str(speed) +"\r"
-        self.ser.write(command.encode('ascii'))
+    @check_serial
+    @check_initialized
+    @check_axis_num
+    def move_speed_relative(self, axis_number: int = 1, distance: Optional[float] = None, speed: Optional[float] = None, acceleration: Optional[float] = None, deceleration: Optional[float] = None) -> Tuple[bool, str]:
+        # if not self.ser.is_open:
+        # #     return (False, "Serial port " + self._port + " is not open. ")
+        # if not self.is_axis_num_valid(axis_number):
+        #     return (False, "Axis number is not valid or not part of passed tuple during construction.")
+        # if not self._is_initialized:
+        #     return (False, "ESP301 axes are not initialized.")
+        if distance is None:
+            return (False, "Distance was not specified")
 
-        was_successful, message = self.check_error()
+        was_successful, speed = self._axis_speed(axis_number, speed)
         if not was_successful:
-            return (was_successful, message)
+            return (was_successful, speed)
 
-        if position >= 0.0:
-            sign = "+"
-        else:
-            sign = "-"
+        return self._move_axes("PR", {axis_number: distance}, {axis_number: speed}, self._ramp_dict(axis_number, acceleration), self._ramp_dict(axis_number, deceleration))
+
+    @check_serial
+    @check_initialized
+    def move_multi_absolute(self, positions: Dict[int, float], speeds: Optional[Dict[int, float]] = None, accelerations: Optional[Dict[int, float]] = None, decelerations: Optional[Dict[int, float]] = None) -> Tuple[bool, str]:
+        return self._move_axes("PA", positions, speeds, accelerations, decelerations)
+
+    @check_serial
+    @check_initialized
+    def move_multi_relative(self, distances: Dict[int, float], speeds: Optional[Dict[int, float]] = None, accelerations: Optional[Dict[int, float]] = None, decelerations: Optional[Dict[int, float]] = None) -> Tuple[bool, str]:
+        return self._move_axes("PR", distances, speeds, accelerations, decelerations)
+
+    def _ramp_dict(self, axis_number: int, ramp: Optional[float]) -> Dict[int, float]:
+        if ramp is None:
+            return {}
+        return {axis_number: ramp}
+
+    # starts every axis with one write and waits once for all of them
+    def _move_axes(
+            self,
+            move_command: str,
+            targets: Dict[int, float],
+            speeds: Optional[Dict[int, float]] = None,
+            accelerations: Optional[Dict[int, float]] = None,
+            decelerations: Optional[Dict[int, float]] = None) -> Tuple[bool, str]:
+        if not targets:
+            return (False, "No axes were specified")
+        if speeds is None:
+            speeds = {}
+        if accelerations is None:
+            accelerations = {}
+        if decelerations is None:
+            decelerations = {}
+
+        was_successful, axis_speeds = self._axis_speeds(list(targets), speeds)
+        if not was_successful:
+            return (was_successful, axis_speeds)
+        for axis_number in targets:
+            for ramp in (accelerations.get(axis_number), decelerations.get(axis_number)):
+                if ramp is not None and not self._is_ramp_valid(axis_number, ramp):
+                    return (False, "Acceleration is out of bounds for axis " + str(axis_number) + ".")
+
+        # distances are needed to predict the move time and to spot short moves
+        distances = None
+        if self._predictive_wait or self._short_move_threshold_list is not None:
+            distances = dict(targets)
+            if move_command == "PA":
+                was_successful, start_positions = self.positions(list(targets), cached=True)
+                if was_successful:
+                    distances = {axis: target - start_positions[axis] for axis, target in targets.items()}
+                else:
+                    distances = None
+
+        parameter_commands = []
+        axis_ramps = {}
+        for axis_number, speed in axis_speeds.items():
+            acceleration, deceleration = self._move_ramps(axis_number, speed, distances, accelerations, decelerations)
+            axis_ramps[axis_number] = (acceleration, deceleration)
+            parameter_commands.extend(self._parameter_commands(axis_number, 'VA', speed))
+            if acceleration is not None:
+                parameter_commands.extend(self._parameter_commands(axis_number, 'AC', acceleration))
+            if deceleration is not None:
+                parameter_commands.extend(self._parameter_commands(axis_number, 'AG', deceleration))
+        if parameter_commands and not self._pipeline_commands:
+            self._write_commands(parameter_commands)
+            was_successful, message = self.check_error()
+            if not was_successful:
+                return (was_successful, message)
+            parameter_commands = []
+
+        # the slowest axis decides when the whole move is done
+        estimated_time = None
+        slowest_axis = None
+        if self._predictive_wait and distances is not None:
+            for axis_number, distance in distances.items():
+                acceleration, deceleration = axis_ramps[axis_number]
+                axis_time = self.estimate_move_time(axis_number, distance, axis_speeds[axis_number], acceleration, deceleration)
+                if estimated_time is None or axis_time > estimated_time:
+                    estimated_time = axis_time
+                    slowest_axis = axis_number
 
         # removed the WS command because it causes timeouts when checking if moving 
-        # command = str(axis_number) + "PA" + sign + str(abs(position)) + ";" + str(axis_number) + "WS\r"
-        command = str(axis_number) + "PA" + sign + str(abs(position)) + "\r"
-        self.ser.write(command.encode('ascii'))
+        move_commands = [self._format_move(axis_number, move_command, target) for axis_number, target in targets.items()]
+        if move_command == "PA":
+            self._start_motion(targets)
+        else:
+            self._start_motion(self._relative_targets(targets))
+        # in pipeline mode the speed and ramp settings go out on the same line as the moves
+        self._write_commands(parameter_commands + move_commands)
+        start_time = time.monotonic()
 
-        while self.is_moving(axis_number):
-            time.sleep(self._poll_interval)
+        elapsed_time = self._wait_for_motion(list(targets), start_time, estimated_time)
+        self._finish_motion(list(targets))
+        if slowest_axis is not None:
+            self._record_move_time(slowest_axis, estimated_time, elapsed_time)
 
         was_successful, message = self.check_error()
         if not was_successful:
             return (was_successful, message)
-        else:
-            return (True, "Successfully completed absolute move at " + str(position))
 
+        return (True, self._move_message(move_command, targets))
+
+    # visits absolute targets back to back, each move is queued on the controller behind a WS
+    # for the one before it so it starts as soon as that one ends, callback(index, targets)
+    # runs as each point is reached
+    @check_serial
+    @check_initialized
+    def move_queue(
+            self,
+            targets_list: List[Dict[int, float]],
+            speeds: Optional[Dict[int, float]] = None,
+            dwell: float = 0.0,
+            callback: Optional[Callable[[int, Dict[int, float]], None]] = None,
+            accelerations: Optional[Dict[int, float]] = None,
+            decelerations: Optional[Dict[int, float]] = None) -> Tuple[bool, str]:
+        for was_successful, result in self.iter_move_queue(targets_list, speeds, dwell, accelerations, decelerations):
+            if not was_successful:
+                return (was_successful, result)
+            if callback is not None:
+                callback(result, targets_list[result])
+        return (True, "Successfully completed " + str(len(targets_list)) + " queued moves.")
+
+    # yields (True, index) once each point is reached and its dwell is over. the dwell runs on
+    # the controller (WT) and the next move is already queued, so by the time the index is
+    # yielded the stage is on its way to the next point. the line for the point after that is
+    # written when iteration resumes, so the controller is never more than one move ahead.
+    # every line ends its wait with TB?, a failed point stops all queued axes and yields
+    # (False, message). the port is held while a queued line waits, other readers such as
+    # ESP301PositionSampler get it between points
+    def iter_move_queue(
+            self,
+            targets_list: List[Dict[int, float]],
+            speeds: Optional[Dict[int, float]] = None,
+            dwell: float = 0.0,
+            accelerations: Optional[Dict[int, float]] = None,
+            decelerations: Optional[Dict[int, float]] = None) -> Iterator[Tuple[bool, Union[str, int]]]:
+        if not self.ser.is_open:
+            yield (False, "Serial port " + self.port + " is not open. ")
+            return
+        if not self._is_initialized:
+            yield (False, "ESP301 axes are not initialized.")
+            return
+        if speeds is None:
+            speeds = {}
+        if accelerations is None:
+            accelerations = {}
+        if decelerations is None:
+            decelerations = {}
+
+        axis_list = []
+        for targets in targets_list:
+            for axis_number in targets:
+                if not self.is_axis_num_valid(axis_number):
+                    yield (False, "Axis number " + str(axis_number) + " is not valid or not part of passed tuple during construction.")
+                    return
+                if axis_number not in axis_list:
+                    axis_list.append(axis_number)
+        if not axis_list:
+            return
+
+        was_successful, axis_speeds = self._axis_speeds(axis_list, speeds)
+        if not was_successful:
+            yield (was_successful, axis_speeds)
+            return
+        for axis_number in axis_list:
+            for ramp in (accelerations.get(axis_number), decelerations.get(axis_number)):
+                if ramp is not None and not self._is_ramp_valid(axis_number, ramp):
+                    yield (False, "Acceleration is out of bounds for axis " + str(axis_number) + ".")
+                    return
+
+        # only the first point needs the real position, later moves start from the previous target
+        was_successful, positions = self.positions(axis_list, cached=True)
+        if not was_successful:
+            yield (was_successful, positions)
+            return
+
+        dwell_commands = ["WT" + str(int(round(dwell * 1000)))] if dwell > 0.0 else []
+        move_commands, estimated_time = self._queued_move_commands(targets_list[0], positions, axis_speeds, accelerations, decelerations)
+        self._start_motion(targets_list[0])
+        self._write_commands(move_commands)
+
+        for ndx, targets in enumerate(targets_list):
+            # wait for this point on the controller, dwell, report errors, then start the next point
+            commands = [str(axis_number) + "WS" for axis_number in targets] + dwell_commands + ["TB?"]
+            next_targets = targets_list[ndx+1] if ndx + 1 < len(targets_list) else {}
+            next_estimated_time = 0.0
+            if next_targets:
+                move_commands, next_estimated_time = self._queued_move_commands(next_targets, positions, axis_speeds, accelerations, decelerations)
+                commands.extend(move_commands)
+                # axes that only move from the next point on are already committed to it
+                self._start_motion({axis_number: target for axis_number, target in next_targets.items() if axis_number not in targets})
+
+            # generous bound, the estimate is short when the controller did not report its ramps
+            timeout = max(2.0 * estimated_time, estimated_time + 1.0) + dwell
+            with self._serial_lock:
+                self._write_commands(commands)
+                response = self._read_queued_reply(time.monotonic() + timeout)
+
+            if response == b'':
+                self._abort_motion(axis_list)
+                yield (False, "Point " + str(ndx) + " was not reached within " + str(round(timeout, 3)) + " s.")
+                return
+            response = response.strip().decode('ascii')
+            error = self._parse_error(response)
+            if error.code != 0:
+                # the next move already started behind the failed one
+                self._abort_motion(axis_list)
+                self._last_errors = [error]
+                was_drained, errors = self.drain_errors()
+                if was_drained:
+                    self._last_errors.extend(errors)
+                yield (False, response)
+                return
+
+            self._finish_motion(list(targets))
+            if next_targets:
+                self._start_motion(next_targets)
+            estimated_time = next_estimated_time
+            yield (True, ndx)
+
+    # speed, ramp and move commands for one queued point, and its estimated move time.
+    # positions holds where each axis will be when the point starts and is moved on to the targets
+    def _queued_move_commands(
+            self,
+            targets: Dict[int, float],
+            positions: Dict[int, float],
+            axis_speeds: Dict[int, float],
+            accelerations: Dict[int, float],
+            decelerations: Dict[int, float]) -> Tuple[List[str], float]:
+        distances = {axis_number: target - positions[axis_number] for axis_number, target in targets.items()}
+        commands = []
+        estimated_time = 0.0
+        for axis_number in targets:
+            speed = axis_speeds[axis_number]
+            acceleration, deceleration = self._move_ramps(axis_number, speed, distances, accelerations, decelerations)
+            commands.extend(self._parameter_commands(axis_number, 'VA', speed))
+            if acceleration is not None:
+                commands.extend(self._parameter_commands(axis_number, 'AC', acceleration))
+            if deceleration is not None:
+                commands.extend(self._parameter_commands(axis_number, 'AG', deceleration))
+            estimated_time = max(estimated_time, self.estimate_move_time(axis_number, distances[axis_number], speed, acceleration, deceleration))
+        commands.extend([self._format_move(axis_number, "PA", target) for axis_number, target in targets.items()])
+        positions.update(targets)
+        return (commands, estimated_time)
+
+    # the reply to a line held up by WS arrives when the move ends, which can be many port timeouts away
+    def _read_queued_reply(self, deadline: float) -> bytes:
+        with self._serial_lock:
+            while True:
+                response = self.ser.readline()
+                if response != b'' or time.monotonic() >= deadline:
+                    return response
+
+    # stops the axes after losing track of a move, the caches are dropped since where they
+    # stopped and what they had applied is unknown
+    def _abort_motion(self, axis_list: List[int]) -> None:
+        self._write_commands([str(axis_number) + "ST" for axis_number in axis_list])
+        # a reply that turns up after giving up would be read as the answer to the next query
+        self.ser.reset_input_buffer()
+        self._parameter_cache = {}
+        self.invalidate_positions()
+        self._finish_motion(axis_list)
+
+    # constant-velocity scan from start to end, callback(event) runs as each threshold is crossed
     @check_serial
     @check_initialized
     @check_axis_num
+    def fly_scan(
+            self,
+            axis_number: int = 1,
+            start: Optional[float] = None,
+            end: Optional[float] = None,
+            speed: Optional[float] = None,
+            thresholds: Optional[List[float]] = None,
+            callback: Optional[Callable[[ESP301CrossingEvent], None]] = None) -> Tuple[bool, Union[str, List[ESP301CrossingEvent]]]:
+        if start is None or end is None:
+            return (False, "Scan range was not specified")
+        if start == end:
+            return (False, "Scan range is empty")
+        was_successful, speed = self._axis_speed(axis_number, speed)
+        if not was_successful:
+            return (was_successful, speed)
+        if thresholds is None:
+            thresholds = []
+        direction = 1.0 if end > start else -1.0
+        for threshold in thresholds:
+            if (threshold - start) * direction < 0.0 or (end - threshold) * direction < 0.0:
+                return (False, "Threshold " + str(threshold) + " is outside the scan range.")
+
+        # the approach to the start uses the default speed
+        was_successful, message = self.move_speed_absolute(axis_number, start)
+        if not was_successful:
+            return (was_successful, message)
+
+        # thresholds in the order they will be crossed
+        pending = sorted(range(len(thresholds)), key=lambda ndx: thresholds[ndx] * direction)
+        events = []
+
+        self._start_motion({axis_number: end})
+        self._write_commands(self._parameter_commands(axis_number, 'VA', speed) + [self._format_move(axis_number, "PA", end)])
+        last_position = start
+        last_time = time.monotonic()
+        while True:
+            was_successful, values = self._query_batch([str(axis_number) + "TP", str(axis_number) + "MD?"])
+            sample_time = time.monotonic()
+            if not was_successful:
+                # the axis would otherwise keep going to end with nobody watching
+                self._abort_motion([axis_number])
+                return (was_successful, values)
+            try:
+                position = float(values[0])
+            except ValueError:
+                self._abort_motion([axis_number])
+                return (False, "Invalid position response: " + values[0])
+
+            while pending and (position - thresholds[pending[0]]) * direction >= 0.0:
+                ndx = pending.pop(0)
+                threshold = thresholds[ndx]
+                # linear interpolation between the samples either side of the crossing
+                if position != last_position:
+                    timestamp = last_time + (sample_time - last_time) * (threshold - last_position) / (position - last_position)
+                else:
+                    timestamp = sample_time
+                event = ESP301CrossingEvent(ndx, threshold, position, timestamp)
+                events.append(event)
+                if callback is not None:
+                    callback(event)
+
+            # MD? answers 0 while the axis is still moving
+            if values[1] != '0':
+                self._finish_motion([axis_number])
+                break
+            last_position = position
+            last_time = sample_time
+            time.sleep(self._fine_poll_interval)
+
+        was_successful, message = self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        return (True, events)
 
+    # anything queued with _queue_commands rides along with the next line that is written
+    def _write_commands(self, commands: List[str]) -> None:
+        with self._serial_lock:
+            command = ";".join(self._pending_commands + commands) + "\r"
+            self._pending_commands = []
+            self._write(command)
 
+    # sends queued parameter changes without waiting for the next move
+    @check_serial
+    def flush_commands(self) -> Tuple[bool, str]:
+        if not self._pending_commands:
+            return (True, "No queued commands.")
+        self._write_commands([])
+        return self.check_error()
+
+    def _queue_commands(self, commands: List[str]) -> None:
+        if self._pipeline_commands:
+            with self._serial_lock:
+                self._pending_commands.extend(commands)
+        else:
+            self._write_commands(commands)
+
+    # queued parameter changes as a line of their own, so whatever is written next (a query,
+    # a home, a program run) already sees them on the controller
+    def _take_pending_line(self) -> str:
+        if not self._pending_commands:
+            return ""
+        line = ";".join(self._pending_commands) + "\r"
+        self._pending_commands = []
+        return line
+
+    # every exchange with the controller goes through _write/_query so a background
+    # reader (see ESP301PositionSampler) can share the port with the command path
+    def _write(self, command: str) -> None:
+        with self._serial_lock:
+            self.ser.write((self._take_pending_line() + command).encode('ascii'))
+
+    def _query(self, command: str) -> bytes:
+        with self._serial_lock:
+            self.ser.write((self._take_pending_line() + command).encode('ascii'))
+            return self.ser.readline()
+
+    # stores a sequence of moves on the controller so it can run without host round trips between steps
     @check_serial
     @check_initialized
-    @check_axis_num
-    def move_speed_relative(self, axis_number: int = 1, distance: Optional[float] = None, speed: Optional[float] = None) -> Tuple[bool, str]:
-        # if not self.ser.is_open:
-        # #     return (False, "Serial port " + self._port + " is not open. ")
-        # if not self.is_axis_num_valid(axis_number):
-        #     return (False, "Axis number is not valid or not part of passed tuple during construction.")
-        # if not self._is_initialized:
-        #     return (False, "ESP301 axes are not initialized.")
-        if distance is None:
-            return (False, "Distance was not specified")
-        
-        if speed is None:
-            speed = self._default_speed_list[axis_number-1]
-            #speed = self._default_speed
+    def upload_program(self, program_number: int, moves: List[ESP301Move]) -> Tuple[bool, str]:
+        if program_number < 1 or program_number > 100:
+            return (False, "Program number must be between 1 and 100.")
+        if not moves:
+            return (False, "Program has no moves.")
+
+        lines = []
+        for move in moves:
+            if move.move_command not in ("PA", "PR"):
+                return (False, "Invalid move command: " + str(move.move_command))
+            was_successful, axis_speeds = self._axis_speeds(list(move.targets), move.speeds or {})
+            if not was_successful:
+                return (was_successful, axis_speeds)
+            for axis_number, target in move.targets.items():
+                if target is None:
+                    return (False, "Target for axis " + str(axis_number) + " was not specified")
+            commands = [str(axis_number) + "VA" + str(speed) for axis_number, speed in axis_speeds.items()]
+            commands.extend([self._format_move(axis_number, move.move_command, target) for axis_number, target in move.targets.items()])
+            # inside a program WS blocks the program, not the host
+            commands.extend([str(axis_number) + "WS" for axis_number in move.targets])
+            if move.dwell > 0.0:
+                commands.append("WT" + str(int(round(move.dwell * 1000))))
+            lines.append(";".join(commands))
+
+        # erase any previous program with that number, only the error for a missing program is ignored
+        was_successful, message = self._remove_ignoring([str(program_number) + "XX"], PROGRAM_NOT_FOUND_ERROR)
+        if not was_successful:
+            return (was_successful, message)
 
-        # ensure speed is within bounds
-        if speed <= 0.0 or speed > self._max_speed_list[axis_number-1]:
-            return (False, "Speed is out of bounds.")
+        command = str(program_number) + "EP\r" + "\r".join(lines) + "\rQP\r"
+        self._write(command)
+
+        was_successful, message = self.check_error()
+        if not was_successful:
+            self._programs.pop(program_number, None)
+            return (was_successful, message)
+        self._programs[program_number] = list(moves)
+        return (True, "Successfully uploaded program " + str(program_number) + " with " + str(len(moves)) + " moves.")
 
-        command = str(axis_number) + "VA" + str(speed) +"\r"
-        self.ser.write(command.encode('ascii'))
+    # axes in a motion group move together along a straight line, interpolated by the controller
+    @check_serial
+    @check_initialized
+    def create_motion_group(self, group_number: int, axis_list: List[int]) -> Tuple[bool, str]:
+        if len(axis_list) < 2:
+            return (False, "A motion group needs at least two axes.")
+        for axis_number in axis_list:
+            if not self.is_axis_num_valid(axis_number):
+                return (False, "Axis number " + str(axis_number) + " is not valid or not part of passed tuple during construction.")
+
+        # delete any previous group with that number, only the error for a missing group is ignored
+        was_successful, message = self._remove_ignoring([str(group_number) + "HX"], GROUP_NOT_ASSIGNED_ERROR)
+        if not was_successful:
+            return (was_successful, message)
 
+        self._write_commands([str(group_number) + "HN" + ",".join([str(axis) for axis in axis_list]), str(group_number) + "HO"])
         was_successful, message = self.check_error()
         if not was_successful:
+            self._motion_groups.pop(group_number, None)
             return (was_successful, message)
+        self._motion_groups[group_number] = list(axis_list)
+        return (True, "Successfully created motion group " + str(group_number) + " with axes " + ", ".join([str(axis) for axis in axis_list]))
 
-        if distance >= 0.0:
-            sign = "+"
+    @check_serial
+    def delete_motion_group(self, group_number: int) -> Tuple[bool, str]:
+        if group_number not in self._motion_groups:
+            return (False, "Motion group " + str(group_number) + " was not created during this session.")
+        self._write_commands([str(group_number) + "HF", str(group_number) + "HX"])
+        self._motion_groups.pop(group_number)
+
+        was_successful, message = self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        return (True, "Successfully deleted motion group " + str(group_number))
+
+    # straight-line move of the whole group, speed is the speed along the path and defaults
+    # to the fastest path speed that keeps every axis within its default speed
+    @check_serial
+    @check_initialized
+    def move_group_linear(self, group_number: int, positions: Dict[int, float], speed: Optional[float] = None) -> Tuple[bool, str]:
+        if group_number not in self._motion_groups:
+            return (False, "Motion group " + str(group_number) + " was not created during this session.")
+        axis_list = self._motion_groups[group_number]
+        if sorted(positions) != sorted(axis_list):
+            return (False, "Positions must be given for exactly the axes of motion group " + str(group_number) + ".")
+
+        was_successful, start_positions = self.positions(axis_list, cached=True)
+        if not was_successful:
+            return (was_successful, start_positions)
+        deltas = {axis: positions[axis] - start_positions[axis] for axis in axis_list}
+        length = math.sqrt(sum([delta * delta for delta in deltas.values()]))
+        if length == 0.0:
+            return (True, "Motion group " + str(group_number) + " was already at " + str(positions))
+
+        # each axis moves at path speed * |delta| / length, so the path speed and acceleration
+        # are limited by the axis that has to cover the largest share of the path
+        max_speed = math.inf
+        default_speed = math.inf
+        acceleration = math.inf
+        for axis_number, delta in deltas.items():
+            if delta == 0.0:
+                continue
+            share = abs(delta) / length
+            max_speed = min(max_speed, self._max_speed_list[axis_number-1] / share)
+            default_speed = min(default_speed, self._default_speed_list[axis_number-1] / share)
+            axis_acceleration = self._axis_acceleration(axis_number)
+            if axis_acceleration is not None and axis_acceleration > 0.0:
+                acceleration = min(acceleration, axis_acceleration / share)
+        if speed is None:
+            speed = default_speed
+        # ensure speed is within bounds
+        if speed <= 0.0 or speed > max_speed:
+            return (False, "Path speed is out of bounds, the maximum along this path is " + str(max_speed) + ".")
+
+        commands = [str(group_number) + "HV" + str(speed)]
+        if acceleration < math.inf:
+            commands.extend([str(group_number) + "HA" + str(acceleration), str(group_number) + "HD" + str(acceleration)])
         else:
-            sign = "-"
+            acceleration = None
+        commands.append(str(group_number) + "HL" + ",".join([str(positions[axis]) for axis in axis_list]))
 
-        # removed the WS command because it causes timeouts when checking if moving 
-        # command = str(axis_number) + "PR" + sign + str(abs(distance)) + ";" + str(axis_number) + "WS\r"
-        command = str(axis_number) + "PR" + sign + str(abs(distance)) + "\r"
+        estimated_time = None
+        if self._predictive_wait:
+            estimated_time = self._profile_time(length, speed, acceleration)
 
-        self.ser.write(command.encode('ascii'))
+        self._start_motion(positions)
+        self._write_commands(commands)
+        start_time = time.monotonic()
+        self._wait_for_motion(axis_list, start_time, estimated_time)
+        self._finish_motion(axis_list)
 
-        while self.is_moving(axis_number):
-            time.sleep(self._poll_interval)
+        was_successful, message = self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        return (True, "Successfully completed linear group move at " + str(positions))
+
+    @check_serial
+    @check_initialized
+    def execute_program(self, program_number: int) -> Tuple[bool, str]:
+        if program_number not in self._programs:
+            return (False, "Program " + str(program_number) + " was not uploaded during this session.")
+        moves = self._programs[program_number]
+
+        axis_list = []
+        for move in moves:
+            for axis_number in move.targets:
+                if axis_number not in axis_list:
+                    axis_list.append(axis_number)
+
+        # the program's PA targets are desired positions, so the walk starts from DP rather than
+        # TP, which differs from it by the servo's following error
+        was_successful, values = self._query_batch([str(axis) + "DP?" for axis in axis_list])
+        if not was_successful:
+            return (was_successful, values)
+        try:
+            positions = {axis: float(value) for axis, value in zip(axis_list, values)}
+        except ValueError:
+            return (False, "Invalid position response: " + ",".join(values))
+
+        # walk the program to know where it ends and roughly how long it runs
+        estimated_time = 0.0
+        for move in moves:
+            speeds = move.speeds or {}
+            move_time = 0.0
+            for axis_number, target in move.targets.items():
+                speed = speeds.get(axis_number)
+                if speed is None:
+                    speed = self._default_speed_list[axis_number-1]
+                if move.move_command == "PA":
+                    distance = target - positions[axis_number]
+                    positions[axis_number] = target
+                else:
+                    distance = target
+                    positions[axis_number] += target
+                move_time = max(move_time, self.estimate_move_time(axis_number, distance, speed))
+            estimated_time += move_time + move.dwell
+
+        command = str(program_number) + "EX\r"
+        self._start_motion(positions)
+        if self._pending_commands:
+            self._write_commands([])
+        self._write(command)
+        start_time = time.monotonic()
+
+        # the program changes VA behind the driver's back
+        for axis_number in axis_list:
+            self._parameter_cache.get(axis_number, {}).pop('VA', None)
+
+        remaining = start_time + estimated_time - self._wake_margin - time.monotonic()
+        if remaining > 0.0:
+            time.sleep(remaining)
+
+        # axes are briefly idle between steps, so the program is only done once every
+        # axis has stopped at the commanded position of its last step, a program stopped
+        # by an error never gets there so the wait gives up at twice the estimate
+        queries = [str(axis) + "MD?" for axis in axis_list] + [str(axis) + "DP?" for axis in axis_list]
+        tolerances = {axis: position_tolerances.get(self._units_list[axis-1], 1e-3) for axis in axis_list}
+        deadline = start_time + 2.0 * estimated_time + 5.0
+        while True:
+            was_successful, values = self._query_batch(queries)
+            if not was_successful:
+                return (was_successful, values)
+            motion_done = all([value != '0' for value in values[:len(axis_list)]])
+            try:
+                at_target = all([abs(float(value) - positions[axis]) <= tolerances[axis] for axis, value in zip(axis_list, values[len(axis_list):])])
+            except ValueError:
+                return (False, "Invalid position response: " + ",".join(values))
+            if motion_done and at_target:
+                self._finish_motion(axis_list)
+                break
+            if time.monotonic() > deadline:
+                was_successful, message = self.check_error()
+                if not was_successful:
+                    return (was_successful, message)
+                return (False, "Program " + str(program_number) + " did not finish within " + str(round(deadline - start_time, 3)) + " s.")
+            time.sleep(self._fine_poll_interval)
+        # the last step may end with a dwell
+        time.sleep(moves[-1].dwell)
 
         was_successful, message = self.check_error()
         if not was_successful:
             return (was_successful, message)
-        else:
-            return (True, "Successfully completed relative move by " + str(distance))
-        
+        return (True, "Successfully executed program " + str(program_number))
 
-    def is_axis_num_valid(self, axis_number: int) -> bool:
-        if axis_number in self._axis_list:
-            return True
-        else:
+    # (acceleration, deceleration) the controller currently has, None where it did not answer
+    def axis_ramps(self, axis_number: int = 1) -> Tuple[Optional[float], Optional[float]]:
+        return (self._axis_acceleration(axis_number), self._axis_parameter(axis_number, 'AG'))
+
+    # ramps default to what the controller currently has
+    def estimate_move_time(self, axis_number: int, distance: float, speed: float, acceleration: Optional[float] = None, deceleration: Optional[float] = None) -> float:
+        if acceleration is None:
+            acceleration = self._axis_acceleration(axis_number)
+        if deceleration is None:
+            deceleration = self._axis_parameter(axis_number, 'AG')
+        return self._profile_time(distance, speed, acceleration, deceleration)
+
+    # estimated seconds saved so far by running short moves at the maximum acceleration
+    @property
+    def short_move_time_saved(self) -> float:
+        return self._short_move_time_saved
+
+    def _is_ramp_valid(self, axis_number: int, ramp: float) -> bool:
+        if ramp <= 0.0:
             return False
-    
+        if self._max_acceleration_list is not None and ramp > self._max_acceleration_list[axis_number-1]:
+            return False
+        return True
+
+    # acceleration and deceleration the driver puts back after a per-move or short-move change
+    def _base_ramps(self, axis_number: int) -> Tuple[Optional[float], Optional[float]]:
+        acceleration = None
+        deceleration = None
+        if self._acceleration_list is not None:
+            acceleration = self._acceleration_list[axis_number-1]
+            deceleration = acceleration
+        elif axis_number in self._axis_configs:
+            acceleration = self._axis_configs[axis_number].acceleration
+            deceleration = self._axis_configs[axis_number].deceleration
+        if self._deceleration_list is not None:
+            deceleration = self._deceleration_list[axis_number-1]
+        return (acceleration, deceleration)
+
+    # per-move ramps win, then the short-move boost, then the base ramps
+    def _move_ramps(
+            self,
+            axis_number: int,
+            speed: float,
+            distances: Optional[Dict[int, float]],
+            accelerations: Dict[int, float],
+            decelerations: Dict[int, float]) -> Tuple[Optional[float], Optional[float]]:
+        acceleration, deceleration = self._base_ramps(axis_number)
+
+        # the boost is only applied when the base ramps are known, so the next long move can restore them
+        if (self._short_move_threshold_list is not None and self._max_acceleration_list is not None
+                and acceleration is not None and deceleration is not None
+                and distances is not None and abs(distances[axis_number]) < self._short_move_threshold_list[axis_number-1]):
+            max_acceleration = self._max_acceleration_list[axis_number-1]
+            base_time = self.estimate_move_time(axis_number, distances[axis_number], speed, acceleration, deceleration)
+            short_time = self._profile_time(distances[axis_number], speed, max_acceleration, max_acceleration)
+            self._short_move_time_saved += max(0.0, base_time - short_time)
+            acceleration = max_acceleration
+            deceleration = max_acceleration
+
+        if axis_number in accelerations:
+            acceleration = accelerations[axis_number]
+        if axis_number in decelerations:
+            deceleration = decelerations[axis_number]
+        elif axis_number in accelerations:
+            deceleration = accelerations[axis_number]
+        return (acceleration, deceleration)
+
+    @property
+    def move_time_stats(self) -> Dict[int, Dict[str, float]]:
+        # per axis: number of predicted moves, last and mean error (actual - estimated) in seconds
+        return self._move_time_stats
+
+    def _axis_acceleration(self, axis_number: int) -> Optional[float]:
+        return self._axis_parameter(axis_number, 'AC')
+
+    # numeric parameters are only queried when they are not in the parameter cache
+    def _axis_parameter(self, axis_number: int, parameter: str) -> Optional[float]:
+        axis_parameters = self._parameter_cache.setdefault(axis_number, {})
+        if parameter not in axis_parameters:
+            command = str(axis_number) + parameter + "?\r"
+            response = self._query(command)
+            try:
+                axis_parameters[parameter] = float(response.strip().decode('ascii'))
+            except ValueError:
+                # includes timeout case
+                axis_parameters[parameter] = None
+        return axis_parameters[parameter]
+
+    def start_serial(self) -> Tuple[bool, str]:
+        # the controller may have been power cycled while the port was closed
+        self._parameter_cache = {}
+        self.invalidate_positions()
+        return super().start_serial()
+
+    def _wait_for_motion(self, axis_list: List[int], start_time: float, estimated_time: Optional[float] = None) -> float:
+        if estimated_time is None:
+            while self._is_axis_list_moving(axis_list):
+                time.sleep(self._poll_interval)
+            return time.monotonic() - start_time
+
+        # sleep through the bulk of the move without touching the port, correcting for
+        # how late the previous estimates were on the slowest axis
+        bias = max([self._move_time_stats.get(axis, {}).get('mean_error', 0.0) for axis in axis_list])
+        remaining = start_time + estimated_time + bias - self._wake_margin - time.monotonic()
+        if remaining > 0.0:
+            time.sleep(remaining)
+
+        while self._is_axis_list_moving(axis_list):
+            time.sleep(self._fine_poll_interval)
+        return time.monotonic() - start_time
+
+    def _is_axis_list_moving(self, axis_list: List[int]) -> bool:
+        if len(axis_list) == 1:
+            return self.is_moving(axis_list[0])
+        was_successful, motion_done = self.motion_done_all(axis_list)
+        if not was_successful:
+            # timeout case
+            return False
+        return not all(motion_done.values())
+
+    def _record_move_time(self, axis_number: int, estimated_time: Optional[float], elapsed_time: float) -> None:
+        if estimated_time is None:
+            return
+        error = elapsed_time - estimated_time
+        stats = self._move_time_stats.setdefault(axis_number, {'count': 0, 'last_error': 0.0, 'mean_error': 0.0})
+        stats['count'] += 1
+        stats['last_error'] = error
+        stats['mean_error'] += (error - stats['mean_error']) / stats['count']
+
+    def _record_home_time(self, axis_number: int, elapsed_time: float) -> None:
+        stats = self._home_time_stats.setdefault(axis_number, {'count': 0, 'last': elapsed_time, 'min': elapsed_time})
+        stats['count'] += 1
+        stats['last'] = elapsed_time
+        stats['min'] = min(stats['min'], elapsed_time)
 
     @check_serial
     @check_initialized
     @check_axis_num
     def change_axis_unit(self, axis_number: int = 1, unit: str = 'millimeter') -> Tuple[bool, str]:
-        unit_mappings = {
-                    'encoder count': '0', 
-                    'motor step': '1',
-                    'millimeter': '2',
-                    'micrometer': '3',
-                    'inches': '4',
-                    'milli-inches': '5', 
-                    'micro-inches': '6',
-                    'degree': '7',
-                    'gradian': '8',
-                    'radian': '9',
-                    'milliradian': '10',
-                    'microradian': '11',
-                }
-        
         if unit.lower() not in unit_mappings:
             return (False, unit + " is not a valid unit type.")
         
         unit_num = unit_mappings[unit.lower()]
 
-        # check if axis is already set to the specified unit
-        was_successful, message = self.get_axis_unit(axis_number)
-        if not was_successful:
-            return (was_successful, message)
-        
-        if message == unit:
+        # check if axis is already set to the specified unit, the query is only needed
+        # when the unit is not in the parameter cache yet
+        if 'SN' not in self._parameter_cache.get(axis_number, {}):
+            was_successful, message = self.get_axis_unit(axis_number)
+            if not was_successful:
+                return (was_successful, message)
+
+        commands = self._parameter_commands(axis_number, 'SN', unit_num)
+        if not commands:
             return (True, 'Axis ' + str(axis_number) + ' was already set to unit: "' + unit +'"')
+        # speeds, acceleration and positions are expressed in the axis unit, so the cached values no longer apply
+        self._parameter_cache[axis_number] = {'SN': unit_num}
+        self.invalidate_positions([axis_number])
+        # the ramps read back at initialize are in the old unit too
+        self._axis_configs.pop(axis_number, None)
+
+        if self._pipeline_commands:
+            # written and error checked together with the next move
+            self._queue_commands(commands)
+            self._units_list[axis_number-1] = unit
+            return (True, "Queued axis " + str(axis_number) + " unit change to " + unit + ".")
 
-        command = str(axis_number) + "SN" + str(unit_num) + "\r"
-        self.ser.write(command.encode('ascii'))
+        self._write_commands(commands)
 
         was_successful, message = self.check_error()
         if not was_successful:
@@ -330,30 +1415,21 @@ class NewportESP301(SerialDevice):
     @check_initialized
     @check_axis_num
     def get_axis_unit(self, axis_number: int = 1) -> Tuple[bool, str]:
-        unit_mappings = {
-                    '0' : 'encoder count', 
-                    '1' : 'motor step',
-                    '2' : 'millimeter',
-                    '3' : 'micrometer',
-                    '4' : 'inches',
-                    '5' : 'milli-inches', 
-                    '6' : 'micro-inches',
-                    '7' : 'degree',
-                    '8' : 'gradian',
-                    '9' : 'radian',
-                    '10' : 'milliradian',
-                    '11' : 'microradian',
-                }
-
-        command = str(axis_number) + "SN?"
-        self.ser.write(command.encode('ascii'))
-
-        response = self.ser.readline().strip().decode('ascii')
+        # answered from the parameter cache once initialize has read the configuration
+        cached_unit = self._parameter_cache.get(axis_number, {}).get('SN')
+        if cached_unit in unit_names:
+            return (True, unit_names[cached_unit])
+
+        command = str(axis_number) + "SN?\r"
+        response = self._query(command).strip().decode('ascii')
 
         was_successful, message = self.check_error()
         if not was_successful:
             return (was_successful, message)
-        return (True, unit_mappings[response])
+        if response not in unit_names:
+            return (False, "Invalid unit response: " + response)
+        self._parameter_cache.setdefault(axis_number, {})['SN'] = response
+        return (True, unit_names[response])
 
 
 
@@ -365,8 +1441,7 @@ class NewportESP301(SerialDevice):
         #     return False
         # else:
         command = str(axis_number) + "MD?\r"
-        self.ser.write(command.encode('ascii'))
-        response = self.ser.readline()
+        response = self._query(command)
 
         if response.strip().decode('ascii') == '0':
             # motion is not done = is moving
@@ -376,21 +1451,65 @@ class NewportESP301(SerialDevice):
             return False
 
     def is_any_moving(self) -> bool:
-        is_moving_list = []
-        for ndx, axis_number in enumerate(self._axis_list):
-            command = str(axis_number) + "MD?\r"
-            self.ser.write(command.encode('ascii'))
-            response = self.ser.readline()
-
-            if response.strip().decode('ascii') == '0':
-                is_moving_list.append(True)
-            else:
-                is_moving_list.append(False)
-
-        if any(is_moving_list):
-            return True
-        else: 
+        was_successful, motion_done = self.motion_done_all()
+        if not was_successful:
+            # timeout case
             return False
+        return not all(motion_done.values())
+
+    # several queries in one command line come back as one comma separated reply,
+    # so polling cost stays one round trip no matter how many axes are queried
+    def _query_batch(self, queries: List[str]) -> Tuple[bool, Union[str, List[str]]]:
+        command = ";".join(queries) + "\r"
+        values = []
+        with self._serial_lock:
+            self._write(command)
+            while len(values) < len(queries):
+                response = self.ser.readline()
+                if response == b'':
+                    return (False, "Response timed out.")
+                values.extend([value.strip() for value in response.strip().decode('ascii').split(',')])
+
+        if len(values) != len(queries):
+            return (False, "Expected " + str(len(queries)) + " values but got: " + ",".join(values))
+        return (True, values)
+
+    # cached=True answers without a query when every axis is idle at a known position
+    @check_serial
+    def positions(self, axis_list: Optional[List[int]] = None, cached: bool = False) -> Tuple[bool, Union[str, Dict[int, float]]]:
+        if axis_list is None:
+            axis_list = list(self._axis_list)
+        for axis_number in axis_list:
+            if not self.is_axis_num_valid(axis_number):
+                return (False, "Axis number " + str(axis_number) + " is not valid or not part of passed tuple during construction.")
+
+        if cached and all([self._is_position_cached(axis) for axis in axis_list]):
+            return (True, {axis: self._confirmed_positions[axis] for axis in axis_list})
+
+        motion_epoch = self._motion_epoch
+        was_successful, values = self._query_batch([str(axis) + "TP" for axis in axis_list])
+        if not was_successful:
+            return (was_successful, values)
+        try:
+            positions = {axis: float(value) for axis, value in zip(axis_list, values)}
+        except ValueError:
+            return (False, "Invalid position response: " + ",".join(values))
+        self._confirm_positions(positions, motion_epoch)
+        return (True, positions)
+
+    @check_serial
+    def motion_done_all(self, axis_list: Optional[List[int]] = None) -> Tuple[bool, Union[str, Dict[int, bool]]]:
+        if axis_list is None:
+            axis_list = list(self._axis_list)
+        for axis_number in axis_list:
+            if not self.is_axis_num_valid(axis_number):
+                return (False, "Axis number " + str(axis_number) + " is not valid or not part of passed tuple during construction.")
+
+        was_successful, values = self._query_batch([str(axis) + "MD?" for axis in axis_list])
+        if not was_successful:
+            return (was_successful, values)
+        # MD? answers 0 while the axis is still moving
+        return (True, {axis: value != '0' for axis, value in zip(axis_list, values)})
 
     @check_serial
     def check_error(self) -> Tuple[bool, str]:
@@ -400,10 +1519,12 @@ class NewportESP301(SerialDevice):
         #     return (False, "Serial port " + self._port + " is not open. ")
 
         command = "TB?\r"
-        self.ser.write(command.encode('ascii'))
-        response = self.ser.readline()
+        response = self._query(command)
 
         if response == b'':
+            # the controller may not have applied the writes the parameter cache assumes
+            self._parameter_cache = {}
+            self.invalidate_positions()
             return (False, "Response timed out.")
         
         response = response.strip().decode('ascii')
@@ -411,30 +1532,104 @@ class NewportESP301(SerialDevice):
         if response[0] == '0':
             return (True, "No errors.")
         else:
-            # flush the error buffer
-            for n in range(10):
-                self.ser.write(command.encode('ascii'))
-                self.ser.readline()
-            # flush the serial input buffer
-            time.sleep(0.1)
-            self.ser.reset_input_buffer()
+            # a move may have stopped short of its target
+            self._parameter_cache = {}
+            self.invalidate_positions()
+            # flush the error buffer, the first error is kept in front of whatever else was queued
+            self._last_errors = [self._parse_error(response)]
+            was_drained, errors = self.drain_errors()
+            if was_drained:
+                self._last_errors.extend(errors)
             return (False, response)
-    
+
+    # runs an erase or delete that reports missing_code when there is nothing to remove, errors
+    # left by earlier commands (including queued pipeline commands) are reported before it runs
+    def _remove_ignoring(self, commands: List[str], missing_code: int) -> Tuple[bool, str]:
+        if self._pending_commands:
+            self._write_commands([])
+        was_successful, message = self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+
+        self._write_commands(commands)
+        response = self._query("TB?\r")
+        if response == b'':
+            self._parameter_cache = {}
+            self.invalidate_positions()
+            return (False, "Response timed out.")
+        error = self._parse_error(response.strip().decode('ascii'))
+        if error.code == 0:
+            return (True, "No errors.")
+        was_drained, errors = self._drain_errors()
+        if not was_drained:
+            self._parameter_cache = {}
+            self.invalidate_positions()
+            return (False, errors)
+        unexpected = [queued for queued in [error] + errors if queued.code != missing_code]
+        if not unexpected:
+            return (True, "Nothing to remove.")
+        self._parameter_cache = {}
+        self.invalidate_positions()
+        self._last_errors = unexpected
+        return (False, str(unexpected[0].code) + ", " + str(unexpected[0].timestamp) + ", " + unexpected[0].message)
+
+    # empties the controller's error queue with short per-read deadlines so a missing reply
+    # costs read_timeout rather than the port timeout, and the whole drain at most time_budget
+    @check_serial
+    def drain_errors(self, read_timeout: float = 0.05, time_budget: float = 0.5, max_errors: int = 10) -> Tuple[bool, Union[str, List[ESP301Error]]]:
+        was_drained, errors = self._drain_errors(read_timeout, time_budget, max_errors)
+        if not was_drained or errors:
+            self._parameter_cache = {}
+        return (was_drained, errors)
+
+    def _drain_errors(self, read_timeout: float = 0.05, time_budget: float = 0.5, max_errors: int = 10) -> Tuple[bool, Union[str, List[ESP301Error]]]:
+        errors = []
+        deadline = time.monotonic() + time_budget
+        is_empty = False
+        with self._serial_lock:
+            port_timeout = self.ser.timeout
+            self.ser.timeout = read_timeout
+            try:
+                while len(errors) < max_errors and time.monotonic() < deadline:
+                    response = self._query("TB?\r")
+                    if response == b'':
+                        break
+                    error = self._parse_error(response.strip().decode('ascii'))
+                    if error.code == 0:
+                        is_empty = True
+                        break
+                    errors.append(error)
+                if not is_empty:
+                    # a late reply would otherwise be read as the answer to the next query
+                    time.sleep(read_timeout)
+                    self.ser.reset_input_buffer()
+            finally:
+                self.ser.timeout = port_timeout
+
+        if not is_empty:
+            return (False, "Error queue was not emptied within " + str(time_budget) + " s, read " + str(len(errors)) + " errors.")
+        return (True, errors)
+
     @check_serial
     @check_axis_num
-    def position(self, axis_number: int = 1) -> Tuple[bool, Union[str, float]]:
+    def position(self, axis_number: int = 1, cached: bool = False) -> Tuple[bool, Union[str, float]]:
         # if not self.ser.is_open:
         #     return (False, "Serial port " + self._port + " is not open. ")
         # if not self.is_axis_num_valid(axis_number):
         #     return (False, "Axis number is not valid or not part of passed tuple during construction.")
 
+        if cached and self._is_position_cached(axis_number):
+            return (True, self._confirmed_positions[axis_number])
+
+        motion_epoch = self._motion_epoch
         command = str(axis_number) + "TP\r"
-        self.ser.write(command.encode('ascii'))
-        position_str = self.ser.readline()
+        position_str = self._query(command)
         if position_str == b'':
             return (False, "Response timed out.")
         else:    
-            return (True, float(position_str.strip().decode('ascii')))
+            position = float(position_str.strip().decode('ascii'))
+            self._confirm_positions({axis_number: position}, motion_epoch)
+            return (True, position)
 
     @check_serial
     @check_axis_num
@@ -445,21 +1640,18 @@ class NewportESP301(SerialDevice):
         #     return (False, "Axis number is not valid or not part of passed tuple during construction.")
 
         command = str(axis_number) + "MO\r"
-        self.ser.write(command.encode('ascii'))
+        # the servo may pull the stage when the loop closes
+        self.invalidate_positions([axis_number])
+        self._moving_axes.discard(axis_number)
+        self._write(command)
 
         was_successful, message = self.check_error()
         if not was_successful:
             return (was_successful, message)
 
         command = str(axis_number) + "MO?\r"
-        self.ser.write(command.encode('ascii'))
-        response = self.ser.readline()
-
-        if response.strip().decode('ascii') == '1':
-            return (True, "Axis " + str(axis_number) + " motor successfully turned ON.")
-        else:
-            # also means timeout
-            return (False, "Axis " + str(axis_number) + " motor failed to turned ON.")
+        response = self._query(command)
+        return self._motor_result(axis_number, True, response)
 
     @check_serial
     @check_axis_num
@@ -470,18 +1662,105 @@ class NewportESP301(SerialDevice):
         #     return (False, "Axis number is not valid or not part of passed tuple during construction.")
 
         command = str(axis_number) + "MF\r"
-        self.ser.write(command.encode('ascii'))
+        # an unpowered stage can be moved by hand, so it counts as moving until the motor is back on
+        self.invalidate_positions([axis_number])
+        self._moving_axes.add(axis_number)
+        self._write(command)
 
         was_successful, message = self.check_error()
         if not was_successful:
             return (was_successful, message)
 
         command = str(axis_number) + "MF?\r"
-        self.ser.write(command.encode('ascii'))
-        response = self.ser.readline()
+        response = self._query(command)
+        return self._motor_result(axis_number, False, response)
 
-        if response.strip().decode('ascii') == '0':
-            return (True, "Axis " + str(axis_number) + " motor successfully turned OFF.")
-        else:
-            # also means timeout
-            return (False, "Axis " + str(axis_number) + " motor failed to turned OFF.")
\ No newline at end of file
+    # on-board data acquisition: the controller samples the axis on its own clock during the
+    # move and the whole buffer is downloaded afterwards, so the port stays quiet while moving
+    @check_serial
+    @check_initialized
+    @check_axis_num
+    def configure_data_gathering(self, axis_number: int = 1, sample_count: int = 1000, sample_interval: float = 0.001) -> Tuple[bool, str]:
+        if sample_count <= 0:
+            return (False, "Sample count must be positive.")
+        if sample_interval <= 0.0:
+            return (False, "Sample interval must be positive.")
+
+        # DC<mode>,<axis>,<samples> with mode 1 gathering the actual position of one axis,
+        # DS sets the interval between samples in milliseconds
+        commands = ["DE0", "DC1," + str(axis_number) + "," + str(int(sample_count)), "DS" + str(sample_interval * 1000.0)]
+        self._write_commands(commands)
+
+        was_successful, message = self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        self._data_gathering_count = int(sample_count)
+        return (True, "Configured data gathering of " + str(int(sample_count)) + " samples on axis " + str(axis_number) + ".")
+
+    @check_serial
+    def arm_data_gathering(self) -> Tuple[bool, str]:
+        if self._data_gathering_count is None:
+            return (False, "Data gathering was not configured.")
+        self._write_commands(["DE1"])
+
+        was_successful, message = self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        return (True, "Data gathering armed.")
+
+    @check_serial
+    def data_gathering_done(self) -> bool:
+        response = self._query("DD?\r")
+        return response.strip().decode('ascii') == '1'
+
+    # returns an (n_samples, n_values) array, one row per sample line sent by the controller
+    @check_serial
+    def download_data_gathering(self) -> Tuple[bool, Union[str, "numpy.ndarray"]]:
+        import numpy as np
+
+        response = self._query("DF?\r")
+        try:
+            sample_count = int(response.strip().decode('ascii'))
+        except ValueError:
+            return (False, "Invalid sample count response: " + response.strip().decode('ascii'))
+        if sample_count == 0:
+            return (True, np.empty((0, 0)))
+
+        rows = []
+        with self._serial_lock:
+            self.ser.write("DG?\r".encode('ascii'))
+            for n in range(sample_count):
+                line = self.ser.readline()
+                if line == b'':
+                    return (False, "Response timed out after " + str(len(rows)) + " of " + str(sample_count) + " samples.")
+                try:
+                    rows.append([float(value) for value in line.strip().decode('ascii').split(',')])
+                except ValueError:
+                    return (False, "Invalid sample response: " + line.strip().decode('ascii'))
+
+        was_successful, message = self.check_error()
+        if not was_successful:
+            return (was_successful, message)
+        return (True, np.array(rows))
+
+    # configure, arm, move and download in one call
+    @check_serial
+    @check_initialized
+    @check_axis_num
+    def move_absolute_gathered(self, axis_number: int = 1, position: Optional[float] = None, speed: Optional[float] = None, sample_count: int = 1000, sample_interval: float = 0.001) -> Tuple[bool, Union[str, "numpy.ndarray"]]:
+        was_successful, message = self.configure_data_gathering(axis_number, sample_count, sample_interval)
+        if not was_successful:
+            return (was_successful, message)
+        was_successful, message = self.arm_data_gathering()
+        if not was_successful:
+            return (was_successful, message)
+        was_successful, message = self.move_speed_absolute(axis_number, position, speed)
+        if not was_successful:
+            return (was_successful, message)
+
+        # the buffer may still be filling after the axis stops, a partial buffer is downloaded
+        # once the full gathering time has passed
+        deadline = time.monotonic() + sample_count * sample_interval + self._poll_interval
+        while not self.data_gathering_done() and time.monotonic() < deadline:
+            time.sleep(self._poll_interval)
+        return self.download_data_gathering()
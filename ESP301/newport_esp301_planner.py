@@ -0,0 +1,159 @@
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .newport_esp301 import NewportESP301
+
+
+# points are (n_points, n_axes) arrays, column j is the position of axis_list[j]
+# every move starts all axes together, so a move takes as long as its slowest axis
+
+def move_times(deltas: np.ndarray, speeds: Sequence[float], accelerations: Sequence[float], decelerations: Optional[Sequence[float]] = None) -> np.ndarray:
+    # decelerations default to the accelerations
+    deltas = np.atleast_2d(deltas)
+    if decelerations is None:
+        decelerations = accelerations
+    if deltas.size == 0:
+        return np.zeros(len(deltas))
+    # the driver's own move time model, so plans and predicted waits agree
+    times = NewportESP301._profile_times(deltas, speeds, accelerations, decelerations)
+    return times.max(axis=1)
+
+def travel_time(points: np.ndarray, order: np.ndarray, speeds: Sequence[float], accelerations: Sequence[float], start: Optional[Sequence[float]] = None, decelerations: Optional[Sequence[float]] = None) -> float:
+    path = points[order]
+    if start is not None:
+        path = np.vstack([np.asarray(start, dtype=float), path])
+    if len(path) < 2:
+        return 0.0
+    return float(move_times(np.diff(path, axis=0), speeds, accelerations, decelerations).sum())
+
+def serpentine_order(points: np.ndarray, row_axis: int = 1, column_axis: int = 0, decimals: int = 6) -> np.ndarray:
+    # rows along row_axis, every other row is visited backwards along column_axis
+    rows = np.round(points[:, row_axis], decimals)
+    _, row_index = np.unique(rows, return_inverse=True)
+    columns = np.where(row_index % 2 == 0, points[:, column_axis], -points[:, column_axis])
+    return np.lexsort((columns, row_index))
+
+def spiral_order(points: np.ndarray, center: Optional[Sequence[float]] = None, ring_width: Optional[float] = None) -> np.ndarray:
+    # outward rings around the center, each ring visited by angle in the first two axes
+    if len(points) == 0:
+        return np.empty(0, dtype=int)
+    if center is None:
+        center = points.mean(axis=0)
+    offsets = points - np.asarray(center, dtype=float)
+    radii = np.sqrt((offsets * offsets).sum(axis=1))
+    if ring_width is None:
+        # smallest spacing between distinct coordinates is the grid pitch
+        spacings = [np.diff(np.unique(points[:, ndx])) for ndx in range(points.shape[1])]
+        spacings = np.concatenate(spacings)
+        spacings = spacings[spacings > 0.0]
+        ring_width = float(spacings.min()) if len(spacings) else 1.0
+    rings = np.round(radii / ring_width).astype(int)
+    if points.shape[1] > 1:
+        angles = np.arctan2(offsets[:, 1], offsets[:, 0])
+    else:
+        angles = offsets[:, 0]
+    return np.lexsort((angles, rings))
+
+def nearest_neighbour_order(points: np.ndarray, speeds: Sequence[float], accelerations: Sequence[float], start: Optional[Sequence[float]] = None, decelerations: Optional[Sequence[float]] = None) -> np.ndarray:
+    # greedy tour that always goes to the point with the shortest move time
+    if len(points) == 0:
+        return np.empty(0, dtype=int)
+    remaining = np.ones(len(points), dtype=bool)
+    order = np.empty(len(points), dtype=int)
+    if start is None:
+        current = points[0]
+    else:
+        current = np.asarray(start, dtype=float)
+    for ndx in range(len(points)):
+        candidates = np.flatnonzero(remaining)
+        times = move_times(points[candidates] - current, speeds, accelerations, decelerations)
+        chosen = candidates[np.argmin(times)]
+        order[ndx] = chosen
+        remaining[chosen] = False
+        current = points[chosen]
+    return order
+
+def plan_scan(
+        points: np.ndarray,
+        speeds: Sequence[float],
+        accelerations: Sequence[float],
+        start: Optional[Sequence[float]] = None,
+        methods: Sequence[str] = ('serpentine', 'spiral', 'nearest'),
+        decelerations: Optional[Sequence[float]] = None) -> Tuple[str, np.ndarray, Dict[str, float]]:
+    # returns the fastest method, its visit order and the estimated travel time of every method,
+    # no points give an empty order and 0 s for every method
+    points = np.asarray(points, dtype=float)
+    if points.ndim == 1:
+        points = points[:, np.newaxis]
+
+    orders = {}
+    for method in methods:
+        if method == 'serpentine':
+            if points.shape[1] > 1:
+                orders[method] = serpentine_order(points)
+            else:
+                orders[method] = np.argsort(points[:, 0])
+        elif method == 'spiral':
+            orders[method] = spiral_order(points)
+        elif method == 'nearest':
+            orders[method] = nearest_neighbour_order(points, speeds, accelerations, start, decelerations)
+        else:
+            raise ValueError("Unknown scan order: " + method)
+
+    times = {method: travel_time(points, order, speeds, accelerations, start, decelerations) for method, order in orders.items()}
+    best = min(times, key=times.get)
+    return (best, orders[best], times)
+
+def driver_limits(esp: NewportESP301, axis_list: Sequence[int], speeds: Optional[Dict[int, float]] = None) -> Tuple[List[float], List[float], List[float]]:
+    # speeds default to the driver's default speeds, accelerations and decelerations come from the controller
+    if speeds is None:
+        speeds = {}
+    axis_speeds = []
+    axis_accelerations = []
+    axis_decelerations = []
+    for axis_number in axis_list:
+        speed = speeds.get(axis_number)
+        if speed is None:
+            speed = esp.axis_default_speed(axis_number)
+        acceleration, deceleration = esp.axis_ramps(axis_number)
+        if acceleration is None or acceleration <= 0.0:
+            acceleration = math.inf
+        if deceleration is None or deceleration <= 0.0:
+            deceleration = acceleration
+        axis_speeds.append(speed)
+        axis_accelerations.append(acceleration)
+        axis_decelerations.append(deceleration)
+    return (axis_speeds, axis_accelerations, axis_decelerations)
+
+def run_scan(
+        esp: NewportESP301,
+        axis_list: Sequence[int],
+        points: np.ndarray,
+        speeds: Optional[Dict[int, float]] = None,
+        dwell: float = 0.0,
+        callback: Optional[Callable[[int, Dict[int, float]], None]] = None,
+        methods: Sequence[str] = ('serpentine', 'spiral', 'nearest')) -> Tuple[bool, str]:
+    # plans the visit order from the driver's limits and runs it through the move queue
+    points = np.asarray(points, dtype=float)
+    if points.ndim == 1:
+        points = points[:, np.newaxis]
+    if points.shape[1] != len(axis_list):
+        return (False, "Points have " + str(points.shape[1]) + " columns but " + str(len(axis_list)) + " axes were given.")
+
+    axis_speeds, axis_accelerations, axis_decelerations = driver_limits(esp, axis_list, speeds)
+    was_successful, start = esp.positions(list(axis_list))
+    if not was_successful:
+        return (was_successful, start)
+
+    method, order, times = plan_scan(points, axis_speeds, axis_accelerations, [start[axis] for axis in axis_list], methods, axis_decelerations)
+    targets_list = [{axis: float(value) for axis, value in zip(axis_list, points[ndx])} for ndx in order]
+    point_callback = None
+    if callback is not None:
+        # report the index into points, not into the planned order
+        point_callback = lambda ndx, targets: callback(int(order[ndx]), targets)
+    was_successful, message = esp.move_queue(targets_list, speeds, dwell, point_callback)
+    if not was_successful:
+        return (was_successful, message)
+    return (True, message + " Visited in " + method + " order, estimated travel time " + str(round(times[method], 3)) + " s.")
@@ -0,0 +1,106 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .newport_esp301 import NewportESP301
+
+
+# rows are (timestamp, position of axis_list[0], position of axis_list[1], ...) with
+# time.monotonic() timestamps taken when the reply arrived
+class ESP301PositionSampler:
+    """Background reader of axis positions into a preallocated ring buffer."""
+
+    def __init__(
+            self,
+            esp: NewportESP301,
+            rate: float = 50.0,
+            capacity: int = 100000,
+            axis_list: Optional[List[int]] = None):
+
+        if axis_list is None:
+            axis_list = list(esp._axis_list)
+        self._esp = esp
+        self._axis_list = axis_list
+        self._period = 1.0 / rate
+        self._buffer = np.full((capacity, len(axis_list) + 1), np.nan)
+        self._count = 0 # total samples ever written, the write index is _count % capacity
+        self._buffer_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_error: Optional[str] = None
+
+    @property
+    def axis_list(self) -> List[int]:
+        return self._axis_list
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def last_error(self) -> Optional[str]:
+        return self._last_error
+
+    def start(self) -> Tuple[bool, str]:
+        if self.is_running:
+            return (True, "Sampler was already running.")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ESP301 position sampler", daemon=True)
+        self._thread.start()
+        return (True, "Started sampling axes " + ", ".join([str(axis) for axis in self._axis_list]) + " at " + str(1.0 / self._period) + " Hz.")
+
+    def stop(self) -> Tuple[bool, str]:
+        if not self.is_running:
+            return (True, "Sampler was not running.")
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        return (True, "Stopped sampling after " + str(self._count) + " samples.")
+
+    def clear(self) -> None:
+        with self._buffer_lock:
+            self._buffer[:] = np.nan
+            self._count = 0
+
+    def snapshot(self) -> np.ndarray:
+        # copy of every sample still in the buffer, oldest first
+        with self._buffer_lock:
+            capacity = len(self._buffer)
+            if self._count <= capacity:
+                return self._buffer[:self._count].copy()
+            start = self._count % capacity
+            return np.concatenate([self._buffer[start:], self._buffer[:start]])
+
+    def latest(self, n: int = 1) -> np.ndarray:
+        samples = self.snapshot()
+        return samples[-n:]
+
+    def between(self, start_time: float, end_time: Optional[float] = None) -> np.ndarray:
+        # samples with start_time <= timestamp < end_time, times are time.monotonic()
+        samples = self.snapshot()
+        timestamps = samples[:, 0]
+        if end_time is None:
+            end_time = np.inf
+        return samples[(timestamps >= start_time) & (timestamps < end_time)]
+
+    def _run(self) -> None:
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            was_successful, positions = self._esp.positions(self._axis_list)
+            timestamp = time.monotonic()
+            if was_successful:
+                with self._buffer_lock:
+                    row = self._count % len(self._buffer)
+                    self._buffer[row, 0] = timestamp
+                    self._buffer[row, 1:] = [positions[axis] for axis in self._axis_list]
+                    self._count += 1
+            else:
+                self._last_error = positions
+
+            # keep a fixed rate, skip ticks that were missed instead of bunching up samples
+            next_time += self._period
+            if next_time < timestamp:
+                next_time = timestamp + self._period
+            self._stop_event.wait(next_time - time.monotonic())
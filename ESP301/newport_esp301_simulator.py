@@ -0,0 +1,425 @@
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .newport_esp301 import NewportESP301
+
+
+# error codes as reported by TB?, axis errors are reported as axis * 100 + code
+error_messages = {
+            0: "NO ERROR DETECTED",
+            6: "COMMAND DOES NOT EXIST",
+            7: "PARAMETER OUT OF RANGE",
+            9: "AXIS NUMBER OUT OF RANGE",
+            13: "MOTOR NOT ENABLED",
+            37: "AXIS NUMBER MISSING",
+        }
+
+class _SimulatedAxis:
+    def __init__(self, speed: float, max_speed: float, acceleration: float, max_acceleration: float):
+        self.parameters: Dict[str, float] = {
+            'SN': 2,
+            'SH': 0.0,
+            'VU': max_speed,
+            'VA': speed,
+            'AC': acceleration,
+            'AG': acceleration,
+            'AU': max_acceleration,
+        }
+        self.motor_on = False
+        # current move: starts at start_position at start_time and follows a trapezoidal profile
+        self.start_position = 0.0
+        self.target = 0.0
+        self.start_time = 0.0
+        self.speed = speed
+        self.acceleration = acceleration
+        self.deceleration = acceleration
+        # homing ends by setting the position to the home preset
+        self.position_after_move: Optional[float] = None
+
+    def duration(self) -> float:
+        return NewportESP301._profile_time(self.target - self.start_position, self.speed, self.acceleration, self.deceleration)
+
+    def is_moving(self, now: float) -> bool:
+        return now < self.start_time + self.duration()
+
+    def position(self, now: float) -> float:
+        elapsed = now - self.start_time
+        duration = self.duration()
+        if elapsed >= duration:
+            if self.position_after_move is not None:
+                return self.position_after_move
+            return self.target
+        if elapsed <= 0.0:
+            return self.start_position
+
+        distance = abs(self.target - self.start_position)
+        direction = 1.0 if self.target >= self.start_position else -1.0
+        # peak speed is lower than the commanded speed on a triangular profile
+        peak_speed = min(self.speed, math.sqrt(2.0 * distance * self.acceleration * self.deceleration / (self.acceleration + self.deceleration)))
+        ramp_up = peak_speed / self.acceleration
+        ramp_down = peak_speed / self.deceleration
+        if elapsed < ramp_up:
+            travelled = 0.5 * self.acceleration * elapsed * elapsed
+        elif elapsed < duration - ramp_down:
+            travelled = 0.5 * peak_speed * ramp_up + peak_speed * (elapsed - ramp_up)
+        else:
+            remaining = duration - elapsed
+            travelled = distance - 0.5 * self.deceleration * remaining * remaining
+        return self.start_position + direction * travelled
+
+    def start_move(self, now: float, target: float, position_after_move: Optional[float] = None) -> None:
+        # a new move while moving restarts from the current position, the real controller
+        # blends the profiles but the end point and rough timing are the same
+        self.start_position = self.position(now)
+        self.target = target
+        self.start_time = now
+        self.speed = self.parameters['VA']
+        self.acceleration = self.parameters['AC']
+        self.deceleration = self.parameters['AG']
+        self.position_after_move = position_after_move
+
+    def stop(self, now: float) -> None:
+        position = self.position(now)
+        self.start_position = position
+        self.target = position
+        self.position_after_move = None
+
+# command interpreter for the part of the ESP301 command set the driver uses, motion state
+# is computed from timestamps so nothing runs in the background
+class ESP301Simulator:
+    """Simulated Newport ESP301 motion controller."""
+
+    def __init__(
+            self,
+            axis_list: Tuple[int, ...] = (1, 2, 3),
+            speed: float = 5.0,
+            max_speed: float = 100.0,
+            acceleration: float = 50.0,
+            max_acceleration: float = 200.0,
+            home_distance: Optional[float] = None):
+
+        self._axes = {axis: _SimulatedAxis(speed, max_speed, acceleration, max_acceleration) for axis in axis_list}
+        # homing searches for the switch from wherever the stage is, None homes from the current position
+        self._home_distance = home_distance
+        self._errors: List[Tuple[int, int]] = []
+        self._start_time = time.monotonic()
+        self._lock = threading.Lock()
+        # WS and WT hold back everything after them, later lines included, until this time
+        self._busy_until = 0.0
+        self.command_count = 0
+
+    @property
+    def axes(self) -> Dict[int, _SimulatedAxis]:
+        return self._axes
+
+    # when the last line finished running, its replies go out then
+    @property
+    def busy_until(self) -> float:
+        return self._busy_until
+
+    def inject_error(self, code: int, now: Optional[float] = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        self._errors.append((code, int((now - self._start_time) * 1000)))
+
+    # one command line in, reply lines out, replies of queries on the same line are comma separated
+    def process_line(self, line: str, now: Optional[float] = None) -> List[str]:
+        if now is None:
+            now = time.monotonic()
+        replies = []
+        with self._lock:
+            now = max(now, self._busy_until)
+            for command in line.split(';'):
+                command = command.strip()
+                if not command:
+                    continue
+                self.command_count += 1
+                wait_time = self._wait_time(command, now)
+                if wait_time is not None:
+                    now += wait_time
+                    continue
+                reply = self._process_command(command, now)
+                if reply is not None:
+                    replies.append(reply)
+            self._busy_until = now
+        if not replies:
+            return []
+        return [",".join(replies)]
+
+    @staticmethod
+    def _split_command(command: str) -> Tuple[Optional[int], str, str]:
+        # axis number is None when the command has none
+        ndx = 0
+        while ndx < len(command) and command[ndx].isdigit():
+            ndx += 1
+        axis_number = int(command[:ndx]) if ndx > 0 else None
+        return (axis_number, command[ndx:ndx+2].upper(), command[ndx+2:].strip())
+
+    # seconds the command holds up the rest of the line, None for commands that do not wait.
+    # WS waits for the axis to stop (every axis without a number) plus an optional delay in ms,
+    # WT waits for the given ms
+    def _wait_time(self, command: str, now: float) -> Optional[float]:
+        axis_number, name, argument = self._split_command(command)
+        if name not in ('WS', 'WT'):
+            return None
+        delay = 0.0
+        if argument:
+            try:
+                delay = float(argument) / 1000.0
+            except ValueError:
+                self.inject_error(7, now)
+                return 0.0
+        if name == 'WT':
+            return delay
+        if axis_number is None:
+            axes = list(self._axes.values())
+        elif axis_number in self._axes:
+            axes = [self._axes[axis_number]]
+        else:
+            self.inject_error(9, now)
+            return 0.0
+        stop_time = max([axis.start_time + axis.duration() for axis in axes])
+        return max(0.0, stop_time - now) + delay
+
+    def _process_command(self, command: str, now: float) -> Optional[str]:
+        axis_number, name, argument = self._split_command(command)
+        is_query = argument.startswith('?')
+
+        if name == 'TB' and is_query:
+            if not self._errors:
+                return "0, " + str(int((now - self._start_time) * 1000)) + ", " + error_messages[0]
+            code, timestamp = self._errors.pop(0)
+            return str(code) + ", " + str(timestamp) + ", " + error_messages.get(code % 100, "UNKNOWN ERROR")
+
+        if axis_number is None:
+            self.inject_error(37, now)
+            return None
+        if axis_number not in self._axes:
+            self.inject_error(9, now)
+            return None
+        axis = self._axes[axis_number]
+
+        if name == 'MD' and is_query:
+            return '0' if axis.is_moving(now) else '1'
+        if name == 'TP':
+            return "{:.5f}".format(axis.position(now))
+        if name == 'DP' and is_query:
+            if axis.position_after_move is not None:
+                return "{:.5f}".format(axis.position_after_move)
+            return "{:.5f}".format(axis.target)
+        if name == 'MO':
+            if is_query:
+                return '1' if axis.motor_on else '0'
+            axis.motor_on = True
+            return None
+        if name == 'MF':
+            if is_query:
+                # answers like MO?, which is what the driver checks after MF
+                return '1' if axis.motor_on else '0'
+            axis.stop(now)
+            axis.motor_on = False
+            return None
+        if name == 'ST':
+            axis.stop(now)
+            return None
+
+        if name in ('PA', 'PR', 'OR'):
+            if not axis.motor_on:
+                self.inject_error(axis_number * 100 + 13, now)
+                return None
+            if name == 'OR':
+                # travel to the switch, then the position becomes the home preset
+                start = axis.position(now)
+                distance = abs(start) if self._home_distance is None else self._home_distance
+                axis.start_move(now, start - math.copysign(distance, start), axis.parameters['SH'])
+                return None
+            try:
+                value = float(argument)
+            except ValueError:
+                self.inject_error(7, now)
+                return None
+            if name == 'PA':
+                axis.start_move(now, value)
+            else:
+                axis.start_move(now, axis.position(now) + value)
+            return None
+
+        if name in axis.parameters:
+            if is_query:
+                value = axis.parameters[name]
+                if name == 'SN':
+                    return str(int(value))
+                return "{:.5f}".format(value)
+            try:
+                value = float(argument)
+            except ValueError:
+                self.inject_error(7, now)
+                return None
+            if not self._is_parameter_valid(axis, name, value):
+                self.inject_error(7, now)
+                return None
+            axis.parameters[name] = int(value) if name == 'SN' else value
+            return None
+
+        self.inject_error(6, now)
+        return None
+
+    def _is_parameter_valid(self, axis: _SimulatedAxis, name: str, value: float) -> bool:
+        if name == 'SN':
+            return value == int(value) and 0 <= value <= 11
+        if name == 'VA':
+            return 0.0 < value <= axis.parameters['VU']
+        if name in ('AC', 'AG'):
+            return 0.0 < value <= axis.parameters['AU']
+        if name in ('VU', 'AU'):
+            return value > 0.0
+        return True
+
+# stands in for a pyserial port (assign it to the driver's ser attribute): a reply can be read
+# one round-trip latency after its command was written, plus the time the bytes take on the wire
+class ESP301SimulatedSerial:
+    """pyserial-like transport to an ESP301Simulator."""
+
+    def __init__(
+            self,
+            simulator: Optional[ESP301Simulator] = None,
+            latency: float = 0.0,
+            baudrate: Optional[int] = None,
+            timeout: Optional[float] = 1.0):
+
+        if simulator is None:
+            simulator = ESP301Simulator()
+        self.simulator = simulator
+        self.latency = latency
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        # (time the line can be read, reply bytes)
+        self._replies: List[Tuple[float, bytes]] = []
+        self._line_buffer = ""
+        # when the wire is free again, writes queue behind each other
+        self._wire_free_time = 0.0
+        self.bytes_written = 0
+        self.write_count = 0
+
+    def _transfer_time(self, byte_count: int) -> float:
+        # 10 bits per byte with start and stop bits
+        if self.baudrate is None:
+            return 0.0
+        return byte_count * 10.0 / self.baudrate
+
+    def write(self, data: bytes) -> int:
+        now = time.monotonic()
+        self.write_count += 1
+        self.bytes_written += len(data)
+        start_time = max(now, self._wire_free_time)
+        self._wire_free_time = start_time + self._transfer_time(len(data))
+
+        self._line_buffer += data.decode('ascii')
+        *lines, self._line_buffer = self._line_buffer.split('\r')
+        # the controller sees the line half a round trip after it left the host
+        process_time = self._wire_free_time + self.latency / 2.0
+        for line in lines:
+            replies = self.simulator.process_line(line, process_time)
+            # a line held up by WS or WT answers once it has run
+            line_time = max(process_time, self.simulator.busy_until)
+            for reply in replies:
+                reply_bytes = (reply + "\r\n").encode('ascii')
+                ready_time = line_time + self.latency / 2.0 + self._transfer_time(len(reply_bytes))
+                self._replies.append((ready_time, reply_bytes))
+        return len(data)
+
+    def readline(self) -> bytes:
+        if not self._replies:
+            if self.timeout is not None:
+                time.sleep(self.timeout)
+            return b''
+        ready_time, reply = self._replies[0]
+        wait_time = ready_time - time.monotonic()
+        if self.timeout is not None and wait_time > self.timeout:
+            time.sleep(self.timeout)
+            return b''
+        if wait_time > 0.0:
+            time.sleep(wait_time)
+        self._replies.pop(0)
+        return reply
+
+    @property
+    def in_waiting(self) -> int:
+        now = time.monotonic()
+        return sum([len(reply) for ready_time, reply in self._replies if ready_time <= now])
+
+    def reset_input_buffer(self) -> None:
+        now = time.monotonic()
+        self._replies = [(ready_time, reply) for ready_time, reply in self._replies if ready_time > now]
+
+    def close(self) -> None:
+        self.is_open = False
+
+    def open(self) -> None:
+        self.is_open = True
+
+# serves a simulator on a pseudo terminal so the unmodified driver can open it by port name,
+# POSIX only
+class ESP301PseudoSerialPort:
+    """ESP301Simulator behind a pty device."""
+
+    def __init__(self, simulator: Optional[ESP301Simulator] = None, latency: float = 0.0):
+        import pty
+
+        if simulator is None:
+            simulator = ESP301Simulator()
+        self.simulator = simulator
+        self.latency = latency
+        self._master, self._slave = pty.openpty()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> str:
+        return os.ttyname(self._slave)
+
+    def start(self) -> Tuple[bool, str]:
+        import tty
+
+        # raw mode so \r is not translated and replies go out unchanged
+        tty.setraw(self._slave)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ESP301 simulator", daemon=True)
+        self._thread.start()
+        return (True, "Simulated ESP301 listening on " + self.port + ".")
+
+    def stop(self) -> Tuple[bool, str]:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        os.close(self._master)
+        os.close(self._slave)
+        return (True, "Simulated ESP301 stopped.")
+
+    def _run(self) -> None:
+        import select
+
+        line_buffer = ""
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._master], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                line_buffer += os.read(self._master, 4096).decode('ascii')
+            except OSError:
+                return
+            *lines, line_buffer = line_buffer.split('\r')
+            for line in lines:
+                if self.latency > 0.0:
+                    time.sleep(self.latency / 2.0)
+                replies = self.simulator.process_line(line)
+                if replies:
+                    # a line held up by WS or WT answers once it has run
+                    time.sleep(max(0.0, self.simulator.busy_until - time.monotonic()) + self.latency / 2.0)
+                for reply in replies:
+                    os.write(self._master, (reply + "\r\n").encode('ascii'))